@@ -1,11 +1,13 @@
 from abc import ABCMeta, abstractmethod
 import tensorflow as tf
 from collections import Counter
+from agents.search import AlphaBetaSearch
 
 
 class AgentBase(metaclass=ABCMeta):
 
-    def __init__(self, name, model, local_model, env, verbose=False):
+    def __init__(self, name, model, local_model, env, verbose=False, numpy_inference=True, parallel_search=None,
+                 inference_server=None):
 
         self.name = name
         with tf.name_scope('model'):
@@ -20,8 +22,12 @@ class AgentBase(metaclass=ABCMeta):
         self.env = env
         self.verbose = verbose
         self.sess = None
-        self.killers = dict()
-        self.ttable = dict()
+        self.search = AlphaBetaSearch(env)
+        self.numpy_inference = numpy_inference
+        self.numpy_value_function = None
+        self.parallel_search = parallel_search
+        self.inference_server = inference_server
+        self.inference_client = None
 
         for tvar in self.model.trainable_variables:
             tf.summary.histogram(tvar.op.name, tvar)
@@ -99,19 +105,44 @@ class AgentBase(metaclass=ABCMeta):
     def get_move_function(self, depth):
         return NotImplemented
 
-    def test2(self, d, depth=1):
+    def pull_model(self):
+        # The version is read before the pull so that an update applied in between can only make the cache
+        # look older than the weights, never newer.
+        version = self.sess.run(self.update_count)
         self.sess.run(self.pull_global_model)
-        self.killers = dict()
-        self.ttable = dict()
+        if self.numpy_inference or self.parallel_search is not None or self.inference_server is not None:
+            self.numpy_value_function = self.local_model.numpy_value_function(self.sess)
+        if self.parallel_search is not None:
+            self.parallel_search.set_weights(version, self.numpy_value_function)
+        if self.inference_server is not None:
+            self.inference_server.set_weights(version, self.numpy_value_function)
+            # the cached values come from the server, which every process of the host updates
+            version = self.inference_server.version()
+        self.search.eval_cache.set_version(version)
+
+    def value_function(self):
+        # the NumPy snapshot and the inference server weights are only available after the first pull_model
+        if self.inference_server is not None and self.numpy_value_function is not None:
+            if self.inference_client is None:
+                self.inference_client = self.inference_server.client()
+            # another process may have replaced the server weights since the last pull
+            self.search.eval_cache.set_version(self.inference_server.version())
+            return self.inference_client
+        if self.numpy_value_function is not None:
+            return self.numpy_value_function
+        return self.local_model.value_function(self.sess)
+
+    def test2(self, d, depth=1, time_limit=None, node_limit=None):
+        self.pull_model()
+        self.search.reset()
         self.env.make_board(d['fen'])
-        move = self.get_move(self.env, depth=depth)
+        move = self.get_move(self.env, depth=depth, time_limit=time_limit, node_limit=node_limit)
         result = d['c0'].get(self.env.board.san(move), 0)
         return result
 
     def test(self, test_idx, depth=1):
-        self.sess.run(self.pull_global_model)
-        self.killers = dict()
-        self.ttable = dict()
+        self.pull_model()
+        self.search.reset()
         df = self.env.get_test(test_idx)
         total_result = 0
         for i, (_, row) in enumerate(df.iterrows()):
@@ -137,18 +168,20 @@ class AgentBase(metaclass=ABCMeta):
     #         print('SECOND PLAYER:', self.sess.run([self.second_player_wins, self.second_player_draws, self.second_player_losses]))
     #         print('-' * 100)
 
-    def random_agent_test(self, depth=1):
+    def random_agent_test(self, depth=1, runner=None):
+            if runner is not None:
+                # the games are played in lockstep on the environments of a LockstepRunner
+                return runner.random_agent_test(self.value_function(), depth)
+
             x_counter = Counter()
             for _ in range(100):
-                self.killers = dict()
-                self.ttable = dict()
+                self.search.reset()
                 reward = self.env.play_random(self.get_move_function(depth), True)
                 x_counter.update([reward])
 
             o_counter = Counter()
             for _ in range(100):
-                self.killers = dict()
-                self.ttable = dict()
+                self.search.reset()
                 reward = self.env.play_random(self.get_move_function(depth), False)
                 o_counter.update([reward])
 
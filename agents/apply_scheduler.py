@@ -0,0 +1,83 @@
+import time
+import tensorflow as tf
+
+
+class ApplyScheduler:
+    # Workers enqueue a token after pushing the gradients of an episode, and the chief blocks on the token queue
+    # until episodes_per_apply episodes are in the accumulators. With max_staleness set, the chief applies
+    # whatever has arrived once the first waiting episode is max_staleness seconds old. Has to be created in
+    # every process of the cluster in the same place in the graph, like the agent.
+    def __init__(self, agent, episodes_per_apply=10, max_staleness=None, capacity=1024):
+        self.agent = agent
+        self.episodes_per_apply = episodes_per_apply
+        self.max_staleness = max_staleness
+
+        with tf.name_scope('apply_scheduler'):
+            with tf.colocate_with(agent.episodes_since_apply_grad):
+                queue = tf.FIFOQueue(capacity, tf.int32, shapes=[[]], shared_name='episode_tokens',
+                                     name='episode_tokens')
+            self.enqueue_token = queue.enqueue(1)
+            self.dequeue_token = queue.dequeue()
+            self.num_tokens_ = tf.placeholder(tf.int32, name='num_tokens_')
+            self.dequeue_tokens = queue.dequeue_many(self.num_tokens_)
+            self.queue_size = queue.size()
+
+        self.num_applies = 0
+        self.num_stale_applies = 0
+        self.num_episodes = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.queue_depth = 0
+
+    def episode_done(self, sess):
+        sess.run(self.enqueue_token)
+
+    def wait_and_apply(self, sess):
+        sess.run(self.dequeue_token)
+        t0 = time.time()
+        num_episodes = 1
+
+        if num_episodes < self.episodes_per_apply:
+            num_missing = self.episodes_per_apply - num_episodes
+            if self.max_staleness is None:
+                sess.run(self.dequeue_tokens, feed_dict={self.num_tokens_: num_missing})
+                num_episodes += num_missing
+            else:
+                # single tokens with a timeout: a dequeue_many that times out may already have taken some tokens
+                # off the queue without returning them
+                deadline = t0 + self.max_staleness
+                while num_episodes < self.episodes_per_apply:
+                    timeout_in_ms = int((deadline - time.time()) * 1000)
+                    if timeout_in_ms <= 0:
+                        break
+                    try:
+                        sess.run(self.dequeue_token, options=tf.RunOptions(timeout_in_ms=timeout_in_ms))
+                        num_episodes += 1
+                    except tf.errors.DeadlineExceededError:
+                        break
+                if num_episodes < self.episodes_per_apply:
+                    # only the chief dequeues, so everything counted here can be taken without blocking
+                    num_waiting = min(sess.run(self.queue_size), self.episodes_per_apply - num_episodes)
+                    sess.run(self.dequeue_tokens, feed_dict={self.num_tokens_: num_waiting})
+                    num_episodes += num_waiting
+                if num_episodes < self.episodes_per_apply:
+                    self.num_stale_applies += 1
+
+        sess.run([self.agent.apply_and_reset_grads, self.agent.reset_episodes_since_apply_grad],
+                 feed_dict={self.agent.num_grads_: num_episodes})
+
+        latency = time.time() - t0
+        self.num_applies += 1
+        self.num_episodes += num_episodes
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.queue_depth = sess.run(self.queue_size)
+        return num_episodes
+
+    def stats(self):
+        return {'applies': self.num_applies,
+                'stale_applies': self.num_stale_applies,
+                'episodes_per_apply': self.num_episodes / self.num_applies if self.num_applies else 0.0,
+                'mean_latency': self.total_latency / self.num_applies if self.num_applies else 0.0,
+                'max_latency': self.max_latency,
+                'queue_depth': self.queue_depth}
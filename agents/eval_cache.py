@@ -0,0 +1,71 @@
+from collections import OrderedDict
+import numpy as np
+
+
+class EvalCache:
+    # LRU cache from zobrist hash to network value (and optionally the feature vector) of a position. Entries are
+    # only valid for the model version they were computed with; changing the version empties the cache.
+    def __init__(self, capacity=2 ** 18, store_features=False):
+        self.capacity = capacity
+        self.store_features = store_features
+        self.version = None
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
+
+    def set_version(self, version):
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def clear(self):
+        self.entries.clear()
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return np.array([[entry[0]]])
+
+    def peek(self, key):
+        # like get, but does not count towards hits and misses
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        return np.array([[entry[0]]])
+
+    def feature_vector(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        return entry[1]
+
+    def put(self, key, value, feature_vector=None):
+        if self.store_features and feature_vector is not None:
+            feature_vector = np.asarray(feature_vector, dtype=np.float32)
+        else:
+            feature_vector = None
+        self.entries[key] = (float(np.squeeze(value)), feature_vector)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
@@ -0,0 +1,187 @@
+import os
+import selectors
+import socket
+import struct
+import tempfile
+import time
+from multiprocessing import get_context
+import numpy as np
+from value_model import NumpyValueFunction
+
+NUM_BUCKETS = 17
+
+
+def recv_exactly(conn, num_bytes):
+    data = bytearray(num_bytes)
+    view = memoryview(data)
+    received = 0
+    while received < num_bytes:
+        chunk = conn.recv_into(view[received:])
+        if chunk == 0:
+            return None
+        received += chunk
+    return data
+
+
+def serve(listener, fv_size, shared_weights, weights_lock, weight_shapes, max_batch_size, max_wait_us,
+          histogram, counters):
+    weights = []
+    offset = 0
+    buffer = np.frombuffer(shared_weights, dtype=np.float32)
+    for shape in weight_shapes:
+        size = int(np.prod(shape))
+        weights.append(buffer[offset:offset + size].reshape(shape))
+        offset += size
+    value_function = NumpyValueFunction(*weights)
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    max_wait = max_wait_us / 1e6
+    pending = []
+    num_connections = 0
+
+    def drop(conn):
+        # a client that went away; its requests are dropped and the others are still served
+        nonlocal pending, num_connections
+        selector.unregister(conn)
+        conn.close()
+        num_connections -= 1
+        pending = [request for request in pending if request[0] is not conn]
+
+    while True:
+        timeout = None if not pending else max(0.0, pending[0][2] + max_wait - time.time())
+        for key, _ in selector.select(timeout):
+            if key.fileobj is listener:
+                conn, _ = listener.accept()
+                selector.register(conn, selectors.EVENT_READ)
+                num_connections += 1
+                continue
+            conn = key.fileobj
+            try:
+                header = recv_exactly(conn, 4)
+                data = None if header is None else recv_exactly(conn, 4 * struct.unpack('<I', header)[0] * fv_size)
+            except OSError:
+                data = None
+            if data is None:
+                drop(conn)
+                continue
+            pending.append((conn, np.frombuffer(data, dtype=np.float32).reshape(-1, fv_size), time.time()))
+
+        # clients wait for their answer, so once every one of them has a request pending no more can arrive
+        if not pending or (sum(len(fv) for _, fv, _ in pending) < max_batch_size and len(pending) < num_connections
+                           and time.time() - pending[0][2] < max_wait):
+            continue
+
+        # whole requests in arrival order, up to max_batch_size rows unless the first one is larger
+        num_requests = 1
+        num_rows = len(pending[0][1])
+        while num_requests < len(pending) and num_rows + len(pending[num_requests][1]) <= max_batch_size:
+            num_rows += len(pending[num_requests][1])
+            num_requests += 1
+        batch, pending = pending[:num_requests], pending[num_requests:]
+
+        t0 = time.time()
+        with weights_lock:
+            values = value_function(np.vstack([fv for _, fv, _ in batch]))
+        offset = 0
+        for conn, fv, _ in batch:
+            if conn.fileno() >= 0:
+                try:
+                    conn.sendall(np.ascontiguousarray(values[offset:offset + len(fv)], dtype=np.float32).tobytes())
+                except OSError:
+                    drop(conn)
+            offset += len(fv)
+
+        histogram[min(num_rows.bit_length() - 1, NUM_BUCKETS - 1)] += 1
+        queue_times = [t0 - arrival for _, _, arrival in batch]
+        counters[0] += len(batch)
+        counters[1] += num_rows
+        counters[2] += sum(queue_times)
+        counters[3] = max(counters[3], max(queue_times))
+
+
+class InferenceServer:
+    # One process per host that evaluates the value model for the searches of all local processes. Requests
+    # arrive over a Unix socket and are batched in arrival order until max_batch_size rows are waiting, every
+    # connected client is waiting or the oldest request has waited max_wait_us microseconds, then evaluated in one
+    # forward pass. The server is forked when this object is created, so it must be constructed before any
+    # TensorFlow session or server threads are started; processes forked later connect with client().
+    def __init__(self, weight_shapes, fv_size, socket_path=None, max_batch_size=256, max_wait_us=200):
+        self.weight_shapes = [tuple(shape) for shape in weight_shapes]
+        num_weights = sum(int(np.prod(shape)) for shape in self.weight_shapes)
+        if socket_path is None:
+            socket_path = os.path.join(tempfile.gettempdir(), 'td_inference_%d.sock' % os.getpid())
+        self.socket_path = socket_path
+
+        context = get_context('fork')
+        self.shared_weights = context.RawArray('f', num_weights)
+        self.shared_version = context.RawValue('q', -1)
+        self.weights_lock = context.Lock()
+        self.histogram = context.RawArray('q', NUM_BUCKETS)
+        # requests, rows, total and max queue time in seconds
+        self.counters = context.RawArray('d', 4)
+
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(socket_path)
+        listener.listen(128)
+        self.process = context.Process(target=serve,
+                                       args=(listener, fv_size, self.shared_weights, self.weights_lock,
+                                             self.weight_shapes, max_batch_size, max_wait_us, self.histogram,
+                                             self.counters),
+                                       daemon=True)
+        self.process.start()
+        listener.close()
+
+    def set_weights(self, version, value_function):
+        # every process of the host may call this after a pull; only newer weights replace the current ones
+        with self.weights_lock:
+            if version <= self.shared_version.value:
+                return
+            buffer = np.frombuffer(self.shared_weights, dtype=np.float32)
+            offset = 0
+            for weight in [value_function.W_1, value_function.W_2, value_function.W_3]:
+                buffer[offset:offset + weight.size] = weight.ravel()
+                offset += weight.size
+            self.shared_version.value = version
+
+    def version(self):
+        # version of the weights the server evaluates with, which may be newer than the caller's last pull
+        return self.shared_version.value
+
+    def client(self):
+        return InferenceClient(self.socket_path)
+
+    def stats(self):
+        num_requests, num_rows, total_queue_time, max_queue_time = self.counters[:]
+        num_batches = sum(self.histogram)
+        return {'requests': int(num_requests),
+                'batches': num_batches,
+                'rows_per_batch': num_rows / num_batches if num_batches else 0.0,
+                'batch_histogram': {2 ** bucket: count for bucket, count in enumerate(self.histogram) if count},
+                'mean_queue_us': total_queue_time / num_requests * 1e6 if num_requests else 0.0,
+                'max_queue_us': max_queue_time * 1e6}
+
+    def close(self):
+        self.process.terminate()
+        self.process.join()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class InferenceClient:
+    # Value function backed by an InferenceServer: takes a feature matrix and returns an (n, 1) array of values,
+    # like ValueModel.value_function and NumpyValueFunction. One connection per process.
+    def __init__(self, socket_path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(socket_path)
+
+    def __call__(self, fv):
+        fv = np.ascontiguousarray(np.atleast_2d(fv), dtype=np.float32)
+        self.socket.sendall(struct.pack('<I', len(fv)) + fv.tobytes())
+        data = recv_exactly(self.socket, 4 * len(fv))
+        return np.frombuffer(data, dtype=np.float32).reshape(len(fv), 1)
+
+    def close(self):
+        self.socket.close()
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import Counter
+import numpy as np
+from agents.search import AlphaBetaSearch
+
+
+class BatchingValueFunction:
+    # Value function shared by the games of a LockstepRunner, each searched in its own thread. A call blocks until
+    # every game that is still running has a request pending, then the last caller evaluates all of them in one
+    # call of value_function, so each batch holds one request per game.
+    def __init__(self, value_function):
+        self.value_function = value_function
+        self.condition = threading.Condition()
+        self.num_active = 0
+        self.pending = []
+        self.num_calls = 0
+        self.num_rows = 0
+
+    def add_game(self):
+        with self.condition:
+            self.num_active += 1
+
+    def remove_game(self):
+        with self.condition:
+            self.num_active -= 1
+            if self.pending and len(self.pending) >= self.num_active:
+                self.flush()
+
+    def __call__(self, fv):
+        # a request is [feature matrix, values, error]
+        request = [fv, None, None]
+        with self.condition:
+            self.pending.append(request)
+            if len(self.pending) >= self.num_active:
+                self.flush()
+            else:
+                self.condition.wait_for(lambda: request[1] is not None or request[2] is not None)
+        if request[2] is not None:
+            raise request[2]
+        return request[1]
+
+    def flush(self):
+        # an error of value_function is handed to every request of the batch, so no caller is left waiting
+        requests, self.pending = self.pending, []
+        sizes = [len(request[0]) for request in requests]
+        try:
+            values = self.value_function(np.vstack([request[0] for request in requests]))
+            for request, request_values in zip(requests, np.split(values, np.cumsum(sizes)[:-1])):
+                request[1] = request_values
+        except Exception as e:
+            for request in requests:
+                request[2] = e
+        self.num_calls += 1
+        self.num_rows += sum(sizes)
+        self.condition.notify_all()
+
+
+class LockstepRunner:
+    # Plays games on num_envs environments at once, each with its own search, and batches the leaf evaluations of
+    # all of their searches into one call of the value function.
+    def __init__(self, envs, **search_kwargs):
+        self.envs = envs
+        self.searches = [AlphaBetaSearch(env, **search_kwargs) for env in envs]
+
+    def run(self, play_game, num_games, value_function):
+        # play_game(env, search, value_function, game_idx) plays game game_idx to the end and returns its result
+        batching_value_function = BatchingValueFunction(value_function)
+        results = [None] * num_games
+        game_indices = iter(range(num_games))
+        lock = threading.Lock()
+        errors = []
+
+        def work(env, search):
+            try:
+                while not errors:
+                    with lock:
+                        game_idx = next(game_indices, None)
+                    if game_idx is None:
+                        break
+                    results[game_idx] = play_game(env, search, batching_value_function, game_idx)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                batching_value_function.remove_game()
+
+        t0 = time.time()
+        threads = []
+        for env, search in zip(self.envs, self.searches):
+            batching_value_function.add_game()
+            threads.append(threading.Thread(target=work, args=(env, search)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - t0
+        if errors:
+            raise errors[0]
+
+        self.stats = {'games': num_games,
+                      'games_per_sec': num_games / elapsed if elapsed > 0 else 0.0,
+                      'inference_calls': batching_value_function.num_calls,
+                      'rows_per_call': batching_value_function.num_rows / max(1, batching_value_function.num_calls)}
+        return results
+
+    def random_agent_test(self, value_function, depth=1, num_games=100):
+        # same counts as AgentBase.random_agent_test: wins, draws and losses of X against a random player for
+        # num_games games as X, then the same as O
+        def play_game(env, search, value_function, game_idx):
+            search.reset()
+            return env.play_random(get_move_function(search, value_function, depth), game_idx < num_games)
+
+        results = self.run(play_game, 2 * num_games, value_function)
+        x_counter = Counter(results[:num_games])
+        o_counter = Counter(results[num_games:])
+        return [x_counter[1], x_counter[0], x_counter[-1],
+                o_counter[1], o_counter[0], o_counter[-1]]
+
+
+def get_move_function(search, value_function, depth):
+    def m(env):
+        _, pv, _ = search.search(env.board, depth, value_function)
+        return pv[0] if len(pv) > 0 else env.get_null_move()
+    return m
@@ -0,0 +1,86 @@
+import numpy as np
+
+
+class ReplayBuffer:
+    # Leaf feature vectors with their lambda-return targets in preallocated float32 arrays. Once capacity leaves
+    # are stored, new ones replace the oldest ('fifo'), random ones ('random') or the ones with the smallest
+    # priority ('priority'). With prioritized sampling a leaf is drawn with probability proportional to
+    # priority ** alpha, where the priority is the last |delta| seen for it plus eps, so that leaves with a delta
+    # of 0 (like the last leaf of every episode) are still sampled and get their priority refreshed.
+    def __init__(self, capacity, fv_size, eviction='fifo', prioritized=False, alpha=0.6, beta=0.4, eps=0.01,
+                 random_state=np.random):
+        if eviction not in ['fifo', 'random', 'priority']:
+            raise ValueError('unknown eviction: %s' % eviction)
+        self.capacity = capacity
+        self.eviction = eviction
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+        self.random_state = random_state
+
+        self.features = np.zeros((capacity, fv_size), dtype=np.float32)
+        self.targets = np.zeros((capacity, 1), dtype=np.float32)
+        self.priorities = np.zeros(capacity, dtype=np.float32)
+        self.size = 0
+        self.num_added = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, feature_matrix, targets, priorities=None):
+        num_leaves = len(feature_matrix)
+        if num_leaves == 0:
+            return
+        if priorities is None:
+            # new leaves are sampled at least once before their delta is known
+            priorities = np.full(num_leaves, self.priorities[:self.size].max() if self.size else 1.0)
+        else:
+            priorities = np.abs(priorities) + self.eps
+
+        indices = self.free_indices(min(num_leaves, self.capacity))
+        # more leaves than the capacity: only the last ones are kept
+        self.features[indices] = feature_matrix[-len(indices):]
+        self.targets[indices] = np.reshape(targets, (-1, 1))[-len(indices):]
+        self.priorities[indices] = priorities[-len(indices):]
+        self.num_added += len(indices)
+
+    def free_indices(self, num_leaves):
+        num_stored = self.size
+        num_empty = min(num_leaves, self.capacity - num_stored)
+        indices = np.arange(num_stored, num_stored + num_empty)
+        self.size += num_empty
+        num_evicted = num_leaves - num_empty
+        if num_evicted == 0:
+            return indices
+
+        # only leaves stored before this call are evicted
+        if self.eviction == 'fifo':
+            # leaves are written in order, so the oldest ones follow the last one written
+            start = (self.num_added + num_empty) % self.capacity
+            evicted = (start + np.arange(num_evicted)) % self.capacity
+        elif self.eviction == 'random':
+            evicted = self.random_state.choice(num_stored, num_evicted, replace=False)
+        else:
+            evicted = np.argpartition(self.priorities[:num_stored], num_evicted - 1)[:num_evicted]
+        return np.concatenate([indices, evicted])
+
+    def sample(self, batch_size):
+        # Returns indices, feature vectors, targets and importance sampling weights (all ones without
+        # prioritization) of batch_size leaves drawn with replacement.
+        if self.prioritized:
+            probabilities = self.priorities[:self.size].astype(np.float64) ** self.alpha
+            if probabilities.sum() > 0:
+                probabilities /= probabilities.sum()
+            else:
+                probabilities[:] = 1.0 / self.size
+            indices = self.random_state.choice(self.size, batch_size, p=probabilities)
+            weights = (self.size * probabilities[indices]) ** -self.beta
+            weights /= weights.max()
+        else:
+            indices = self.random_state.randint(self.size, size=batch_size)
+            weights = np.ones(batch_size)
+        return indices, self.features[indices], self.targets[indices], weights.astype(np.float32)
+
+    def update_priorities(self, indices, deltas):
+        self.priorities[indices] = np.abs(deltas) + self.eps
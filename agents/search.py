@@ -0,0 +1,361 @@
+import time
+import numpy as np
+from agents.transposition_table import TranspositionTable, EXACT, LOWERBOUND, UPPERBOUND
+from agents.eval_cache import EvalCache
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class AlphaBetaSearch:
+    def __init__(self, env, leaf_batch_size=256, aspiration_window=0.05, tt_size_mb=16, ordering_heuristics=True,
+                 incremental_features=True, eval_cache_size=2 ** 18, max_qdepth=6, delta_margin=2.0):
+        self.env = env
+        self.leaf_batch_size = leaf_batch_size
+        self.aspiration_window = aspiration_window
+        self.ordering_heuristics = ordering_heuristics
+        self.incremental_features = incremental_features
+        self.max_qdepth = max_qdepth
+        self.delta_margin = delta_margin
+        self.accumulator = None
+        self.killers = dict()
+        self.ttable = TranspositionTable(size_mb=tt_size_mb)
+
+        # Network values persist across searches and are only dropped when the model version changes (see
+        # AgentBase.pull_model). A search object must therefore always be used with the same value function.
+        self.eval_cache = EvalCache(capacity=eval_cache_size)
+        self.prefetched = set()
+
+        # history scores keyed by (turn, move code) and countermoves keyed by the previous move code. Both
+        # persist across searches; history is halved at the start of each search so old games fade out.
+        self.history = dict()
+        self.countermoves = dict()
+
+        self.nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.completed_depth = 0
+        self.deadline = None
+        self.node_limit = None
+
+    def reset(self):
+        self.killers = dict()
+        self.countermoves = dict()
+        self.ttable.clear()
+
+    @property
+    def first_move_cutoff_rate(self):
+        if self.cutoffs == 0:
+            return 0.0
+        return self.first_move_cutoffs / self.cutoffs
+
+    def age(self, depth):
+        # called after a move is made on the real board: every killer is now one ply closer to the root and
+        # transposition table entries from earlier moves become the first candidates for replacement
+        new_killers = dict()
+        for killer_depth, killer_list in self.killers.items():
+            if killer_depth + 1 < depth:
+                new_killers[killer_depth + 1] = killer_list
+        self.killers = new_killers
+
+        self.ttable.new_search()
+
+    def search(self, board, depth, value_function, pre_train=False, time_limit=None, node_limit=None,
+               lower=-1, upper=1):
+        # Iterative deepening from depth 1 up to depth. The first iteration always completes; after that the
+        # search stops as soon as time_limit (seconds) or node_limit is exceeded and returns the deepest
+        # completed iteration. Values outside (lower, upper) are only returned as bounds.
+        self.prefetched = set()
+        self.nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.completed_depth = 0
+        self.history = {key: score // 2 for key, score in self.history.items() if score > 1}
+        self.deadline = None if time_limit is None else time.time() + time_limit
+        self.node_limit = node_limit
+
+        value, pv = None, []
+        for iteration_depth in range(1, depth + 1):
+            try:
+                value, pv = self.aspiration_search(board.copy(), iteration_depth, value, value_function, pre_train,
+                                                   lower, upper)
+            except SearchTimeout:
+                break
+            self.completed_depth = iteration_depth
+
+        leaf_board = board.copy()
+        for move in pv:
+            leaf_board.push(move)
+        return value, pv, leaf_board
+
+    def aspiration_search(self, board, depth, previous_value, value_function, pre_train, lower=-1, upper=1):
+        if self.incremental_features:
+            self.accumulator = self.env.make_feature_accumulator(board)
+        else:
+            self.accumulator = None
+
+        if previous_value is None or self.aspiration_window is None or \
+                not lower < float(np.squeeze(previous_value)) < upper:
+            alpha, beta = lower, upper
+        else:
+            alpha = max(lower, float(np.squeeze(previous_value)) - self.aspiration_window)
+            beta = min(upper, float(np.squeeze(previous_value)) + self.aspiration_window)
+
+        while True:
+            value, pv = self.minimax(board, depth, alpha, beta, value_function, pre_train, is_root=True)
+            if value <= alpha and alpha > lower:
+                alpha = lower
+            elif value >= beta and beta < upper:
+                beta = upper
+            else:
+                return value, pv
+
+    def push(self, board, move):
+        if self.accumulator is None:
+            board.push(move)
+        else:
+            self.accumulator.push(move)
+
+    def pop(self, board):
+        if self.accumulator is None:
+            return board.pop()
+        else:
+            return self.accumulator.pop()
+
+    def feature_vector(self, board):
+        if self.accumulator is None:
+            return self.env.make_feature_vector2(board)
+        else:
+            return self.accumulator.feature_vector()
+
+    def check_budget(self):
+        self.nodes += 1
+        if self.completed_depth == 0:
+            return
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchTimeout()
+        if self.deadline is not None and time.time() > self.deadline:
+            raise SearchTimeout()
+
+    def minimax(self, board, depth, alpha, beta, value_function, pre_train, is_root=False):
+
+        self.check_budget()
+
+        alpha_orig = alpha
+
+        hash_key = self.env.zobrist_hash(board)
+        tt_entry = self.ttable.probe(hash_key)
+        # no cutoffs at the root, which has to return a move: after a fail high on a won position the stored
+        # bound alone would end the re-search
+        if tt_entry is not None and tt_entry[2] >= depth and not is_root:
+            tt_value, tt_flag, _, _ = tt_entry
+            tt_value = np.array([[tt_value]])
+            if tt_flag == EXACT:
+                return tt_value, []
+            elif tt_flag == LOWERBOUND:
+                alpha = max(alpha, tt_value)
+            elif tt_flag == UPPERBOUND:
+                beta = min(beta, tt_value)
+            if alpha >= beta:
+                return tt_value, []
+
+        if board.is_game_over():
+            return self.terminal_value(board, value_function, pre_train), []
+
+        elif depth <= 0:
+            value, pv = self.quiescence(board, 0, alpha, beta, value_function, pre_train, hash_key)
+            if value <= alpha_orig:
+                tt_flag = UPPERBOUND
+            elif value >= beta:
+                tt_flag = LOWERBOUND
+            else:
+                tt_flag = EXACT
+            best_move = self.env.encode_move(pv[0]) if pv else 0
+            self.ttable.store(hash_key, value[0, 0], tt_flag, depth, best_move)
+            return value, pv
+
+        killers = self.killers.get(depth, []) + self.killers.get(depth - 2, [])
+        if self.ordering_heuristics:
+            hash_move = self.env.decode_move(tt_entry[3]) if tt_entry is not None else None
+            previous_move = self.env.encode_move(board.move_stack[-1]) if board.move_stack else None
+            moves = self.env.sort_moves(board, list(board.legal_moves),
+                                        hash_move=hash_move,
+                                        killers=killers,
+                                        countermove=self.countermoves.get(previous_move),
+                                        history=self.history)
+        else:
+            moves = self.env.sort_moves(board, list(board.legal_moves), killers=killers)
+
+        if depth <= 1 and self.leaf_batch_size > 1:
+            self.evaluate_frontier(board, moves, depth - 1, value_function)
+
+        turn = board.turn
+        best_v = -1 if turn else 1
+        best_pv = []
+        for idx, move in enumerate(moves):
+            self.push(board, move)
+            value, pv = self.minimax(board, depth - 1, alpha, beta, value_function, pre_train)
+            self.pop(board)
+            if turn:
+                if value >= best_v:
+                    best_v = value
+                    best_pv = [move] + pv
+                alpha = max(alpha, value)
+            else:
+                if value <= best_v:
+                    best_v = value
+                    best_pv = [move] + pv
+                beta = min(beta, value)
+            if beta <= alpha:
+                if self.killers.get(depth) is None:
+                    self.killers[depth] = [move, None]
+                else:
+                    self.killers[depth] = [move, self.killers[depth][0]]
+                self.update_ordering(board, move, depth, idx)
+                break
+
+        if best_v <= alpha_orig:
+            tt_flag = UPPERBOUND
+        elif best_v >= beta:
+            tt_flag = LOWERBOUND
+        else:
+            tt_flag = EXACT
+        best_move = self.env.encode_move(best_pv[0]) if best_pv else 0
+        self.ttable.store(hash_key, best_v[0, 0], tt_flag, depth, best_move)
+
+        return best_v, best_pv
+
+    def terminal_value(self, board, value_function, pre_train):
+        if pre_train:
+            return value_function(self.feature_vector(board))
+        value = board.result()
+        if isinstance(value, str):
+            return convert_string_result(value)
+        return np.array([[value]])
+
+    def leaf_value(self, board, hash_key, value_function):
+        if hash_key in self.prefetched:
+            # already counted as a hit or miss by evaluate_frontier
+            self.prefetched.discard(hash_key)
+            value = self.eval_cache.peek(hash_key)
+        else:
+            value = self.eval_cache.get(hash_key)
+        if value is None:
+            fv = self.feature_vector(board)
+            value = value_function(fv)
+            self.eval_cache.put(hash_key, value, fv)
+        return value
+
+    def quiescence(self, board, qdepth, alpha, beta, value_function, pre_train, hash_key=None):
+        # Captures and promotions only (every evasion when in check) on top of the stand-pat value of the
+        # network, so the principal variation always ends in a quiet position. Past max_qdepth the
+        # stand-pat value is returned as is.
+        if qdepth > 0:
+            self.check_budget()
+            if board.is_game_over():
+                return self.terminal_value(board, value_function, pre_train), []
+            hash_key = self.env.zobrist_hash(board)
+
+        turn = board.turn
+        if self.env.is_check(board) and qdepth < self.max_qdepth:
+            stand_pat = None
+            best_v = -1 if turn else 1
+        else:
+            stand_pat = self.leaf_value(board, hash_key, value_function)
+            if qdepth >= self.max_qdepth:
+                return stand_pat, []
+            best_v = stand_pat
+            if turn:
+                if stand_pat >= beta:
+                    return stand_pat, []
+                alpha = max(alpha, stand_pat)
+            else:
+                if stand_pat <= alpha:
+                    return stand_pat, []
+                beta = min(beta, stand_pat)
+
+        moves = self.env.sort_moves(board, self.env.get_noisy_moves(board))
+        if stand_pat is not None and self.delta_margin is not None:
+            moves = [move for move in moves if not self.is_futile(board, move, stand_pat, alpha, beta)]
+
+        if moves and self.leaf_batch_size > 1:
+            self.evaluate_frontier(board, moves, None, value_function)
+
+        best_pv = []
+        for move in moves:
+            self.push(board, move)
+            value, pv = self.quiescence(board, qdepth + 1, alpha, beta, value_function, pre_train)
+            self.pop(board)
+            if turn:
+                if value > best_v or (stand_pat is None and not best_pv):
+                    best_v = value
+                    best_pv = [move] + pv
+                alpha = max(alpha, value)
+            else:
+                if value < best_v or (stand_pat is None and not best_pv):
+                    best_v = value
+                    best_pv = [move] + pv
+                beta = min(beta, value)
+            if beta <= alpha:
+                break
+
+        return best_v, best_pv
+
+    def is_futile(self, board, move, stand_pat, alpha, beta):
+        # Delta pruning. Values are treated as tanh(material / 5), the scale of the pre-training targets, so
+        # the material a capture can win plus delta_margin is added in pawns before mapping back.
+        material = np.arctanh(np.clip(stand_pat[0, 0], -0.999999, 0.999999)) * 5
+        gain = self.env.material_gain(board, move) + self.delta_margin
+        if board.turn:
+            return np.tanh((material + gain) / 5) <= alpha
+        else:
+            return np.tanh((material - gain) / 5) >= beta
+
+    def update_ordering(self, board, move, depth, idx):
+        self.cutoffs += 1
+        if idx == 0:
+            self.first_move_cutoffs += 1
+
+        key = (board.turn, self.env.encode_move(move))
+        self.history[key] = self.history.get(key, 0) + max(depth, 1) ** 2
+        if board.move_stack:
+            self.countermoves[self.env.encode_move(board.move_stack[-1])] = move
+
+    def evaluate_frontier(self, board, moves, depth, value_function):
+        # Evaluate the stand-pat value of every child in batched calls to value_function. depth is the remaining
+        # depth of the children in minimax, or None for children inside quiescence, which skips the table probe.
+        # The values are only stored in the evaluation cache here, so the alpha-beta search itself is unchanged.
+        keys = []
+        feature_vectors = []
+        for move in moves:
+            self.push(board, move)
+            if not self.env.is_check(board):
+                hash_key = self.env.zobrist_hash(board)
+                tt_entry = self.ttable.probe(hash_key) if depth is not None else None
+                if not (tt_entry is not None and tt_entry[1] == EXACT and tt_entry[2] >= depth) and \
+                        hash_key not in self.prefetched:
+                    self.prefetched.add(hash_key)
+                    if self.eval_cache.get(hash_key) is None:
+                        keys.append(hash_key)
+                        feature_vectors.append(self.feature_vector(board))
+            self.pop(board)
+
+        for start in range(0, len(keys), self.leaf_batch_size):
+            stop = start + self.leaf_batch_size
+            values = value_function(np.vstack(feature_vectors[start:stop]))
+            for idx, hash_key in enumerate(keys[start:stop]):
+                self.eval_cache.put(hash_key, values[idx:idx + 1], feature_vectors[start + idx])
+
+
+def convert_string_result(string):
+    if string == '1-0':
+        return np.array([[1.0]])
+    elif string == '0-1':
+        return np.array([[-1.0]])
+    elif string == '1/2-1/2':
+        return np.array([[0.0]])
+    elif string == '*':
+        return None
+    else:
+        raise ValueError('Invalid result encountered')
@@ -0,0 +1,112 @@
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+
+
+class SharedParameters:
+    # Weights and gradient accumulators of the value model in shared memory, for a single host. Trainer processes
+    # forked after creation pull copies of the weights and push episode gradients, the chief waits for enough
+    # episodes and writes back the updated weights. Plays the part of the global model and the gradient
+    # accumulators of TDLeafAgent without a parameter server.
+    def __init__(self, shapes):
+        context = get_context('fork')
+        self.shapes = [tuple(shape) for shape in shapes]
+        size = sum(int(np.prod(shape)) for shape in self.shapes)
+
+        self.weights_memory = SharedMemory(create=True, size=4 * size)
+        self.grads_memory = SharedMemory(create=True, size=4 * size)
+        self.weights = self.views(self.weights_memory)
+        self.grad_accums = self.views(self.grads_memory)
+        for grad_accum in self.grad_accums:
+            grad_accum[:] = 0
+
+        self.update_count = context.Value('q', 0, lock=False)
+        self.train_episode_count = context.Value('q', 0)
+        self.episodes_since_apply_grad = context.Value('q', 0, lock=False)
+        self.weights_lock = context.Lock()
+        self.grads_pushed = context.Condition()
+        self.ready = context.Event()
+
+    def views(self, memory):
+        views = []
+        offset = 0
+        for shape in self.shapes:
+            size = int(np.prod(shape))
+            views.append(np.ndarray(shape, dtype=np.float32, buffer=memory.buf, offset=4 * offset))
+            offset += size
+        return views
+
+    def set_weights(self, weights, update_count):
+        with self.weights_lock:
+            for shared_weight, weight in zip(self.weights, weights):
+                shared_weight[:] = weight
+            self.update_count.value = update_count
+        self.ready.set()
+
+    def pull(self):
+        self.ready.wait()
+        with self.weights_lock:
+            return self.update_count.value, [weight.copy() for weight in self.weights]
+
+    def increment_train_episode_count(self):
+        with self.train_episode_count.get_lock():
+            self.train_episode_count.value += 1
+            return self.train_episode_count.value
+
+    def push(self, grads):
+        # grads are the weighted value gradients of one episode, subtracted like update_grad_accums_from_episode
+        with self.grads_pushed:
+            for grad_accum, grad in zip(self.grad_accums, grads):
+                grad_accum -= grad
+            self.episodes_since_apply_grad.value += 1
+            self.grads_pushed.notify()
+
+    def wait_for_grads(self, num_episodes, max_staleness=None):
+        # Blocks until num_episodes episodes have been pushed, or max_staleness seconds after the first one if
+        # fewer arrive. Returns the number of episodes and their mean gradients, and resets the accumulators.
+        with self.grads_pushed:
+            self.grads_pushed.wait_for(lambda: self.episodes_since_apply_grad.value > 0)
+            self.grads_pushed.wait_for(lambda: self.episodes_since_apply_grad.value >= num_episodes, max_staleness)
+            num_grads = self.episodes_since_apply_grad.value
+            grads = [grad_accum / num_grads for grad_accum in self.grad_accums]
+            for grad_accum in self.grad_accums:
+                grad_accum[:] = 0
+            self.episodes_since_apply_grad.value = 0
+        return num_grads, grads
+
+    def update_weights(self, weights):
+        with self.weights_lock:
+            for shared_weight, weight in zip(self.weights, weights):
+                shared_weight[:] = weight
+            self.update_count.value += 1
+
+    def close(self):
+        self.weights = self.grad_accums = None
+        for memory in [self.weights_memory, self.grads_memory]:
+            memory.close()
+            memory.unlink()
+
+
+class NumpyAdam:
+    # The update of tf.train.AdamOptimizer, with the same state so that it can be written to and read from its
+    # slots in a checkpoint.
+    def __init__(self, shapes, learning_rate=0.001, beta1=0.9, beta2=0.999, epsilon=1e-8):
+        self.learning_rate = learning_rate
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.epsilon = epsilon
+        self.m = [np.zeros(shape, dtype=np.float32) for shape in shapes]
+        self.v = [np.zeros(shape, dtype=np.float32) for shape in shapes]
+        self.beta1_power = beta1
+        self.beta2_power = beta2
+
+    def apply_gradients(self, variables, grads):
+        learning_rate = self.learning_rate * np.sqrt(1 - self.beta2_power) / (1 - self.beta1_power)
+        for variable, grad, m, v in zip(variables, grads, self.m, self.v):
+            m *= self.beta1
+            m += (1 - self.beta1) * grad
+            v *= self.beta2
+            v += (1 - self.beta2) * np.square(grad)
+            variable -= learning_rate * m / (np.sqrt(v) + self.epsilon)
+        self.beta1_power *= self.beta1
+        self.beta2_power *= self.beta2
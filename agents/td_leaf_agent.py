@@ -1,6 +1,6 @@
 import tensorflow as tf
 import numpy as np
-from anytree import Node
+from functools import partial
 from agents.agent_base import AgentBase
 from envs.chess import material_value_from_board
 
@@ -11,38 +11,61 @@ class TDLeafAgent(AgentBase):
                  model,
                  local_model,
                  env,
-                 verbose=False):
+                 verbose=False,
+                 leaf_batch_size=256,
+                 store_features=False,
+                 numpy_inference=True,
+                 parallel_search=None,
+                 grad_compression=None,
+                 topk_ratio=0.01,
+                 inference_server=None):
 
-        super().__init__(name, model, local_model, env, verbose)
+        super().__init__(name, model, local_model, env, verbose, numpy_inference, parallel_search, inference_server)
+
+        self.search.leaf_batch_size = leaf_batch_size
+        self.search.eval_cache.store_features = store_features
 
         self.opt = tf.train.AdamOptimizer()
 
         with tf.name_scope('gradient_accumulator'):
-            update_grad_accum_ops = []
             reset_grad_accum_ops = []
             self.grad_accums = []
-            self.grad_accum_s = []
 
             for tvar in self.model.trainable_variables:
                 grad_accum = tf.Variable(tf.zeros_like(tvar), trainable=False, name=tvar.op.name + "_grad_accum")
                 self.grad_accums.append(grad_accum)
-                grad_accum_ = tf.placeholder(tf.float32, shape=tvar.get_shape(), name=tvar.op.name + "_grad_accum_")
-                self.grad_accum_s.append(grad_accum_)
-                update_grad_accum_op = tf.assign_add(grad_accum, grad_accum_)
-                update_grad_accum_ops.append(update_grad_accum_op)
                 reset_grad_accum_op = tf.assign(grad_accum, tf.zeros_like(tvar))
                 reset_grad_accum_ops.append(reset_grad_accum_op)
 
-            self.update_grad_accums_op = tf.group(*update_grad_accum_ops)
             self.reset_grad_accums_op = tf.group(*reset_grad_accum_ops)
 
-        self.grads = tf.gradients(self.local_model.value, self.local_model.trainable_variables)
+        # sum of the leaf gradients of an episode weighted by leaf_weights_, added to the accumulators in one step
+        self.leaf_weights_ = tf.placeholder(tf.float32, shape=[None, 1], name='leaf_weights_')
+        episode_grads = tf.gradients(self.local_model.value, self.local_model.trainable_variables,
+                                     grad_ys=self.leaf_weights_)
+        self.grad_compression = grad_compression
+        # bytes sent to the parameter servers per episode, fixed by the variable shapes and the compression
+        self.push_bytes_per_episode = 0
+        with tf.name_scope('gradient_push'):
+            update_ops = []
+            for grad_accum, episode_grad, local_tvar in zip(self.grad_accums, episode_grads,
+                                                            self.local_model.trainable_variables):
+                update_ops.append(self.push_grad(grad_accum, episode_grad, local_tvar, topk_ratio))
+            self.update_grad_accums_from_episode = tf.group(*update_ops)
         self.num_grads_ = tf.placeholder(tf.int32, name='num_grads_')
-        self.apply_grads = self.opt.apply_gradients(zip([grad_accum/tf.to_float(self.num_grads_) for grad_accum in self.grad_accums],
+        # the accumulators are copied once, then the copies are applied and subtracted, so gradients pushed while
+        # the update runs stay in the accumulators for the next one instead of being zeroed
+        grad_snapshots = [tf.add(grad_accum, 0.0) for grad_accum in self.grad_accums]
+        self.apply_grads = self.opt.apply_gradients(zip([grad_snapshot/tf.to_float(self.num_grads_) for grad_snapshot in grad_snapshots],
                                                         self.model.trainable_variables),
                                                     name='apply_grads', global_step=self.update_count)
+        with tf.control_dependencies([self.apply_grads]):
+            self.apply_and_reset_grads = tf.group(*[tf.assign_sub(grad_accum, grad_snapshot, use_locking=True)
+                                                    for grad_accum, grad_snapshot in zip(self.grad_accums,
+                                                                                         grad_snapshots)])
 
-        ema = tf.train.ExponentialMovingAverage(decay=0.9999)
+        decay = 0.9999
+        ema = tf.train.ExponentialMovingAverage(decay=decay)
 
         delta = tf.Variable(0.0, trainable=False, name='mean_delta')
         self.delta_ = tf.placeholder(tf.float32, name='delta_')
@@ -51,66 +74,75 @@ class TDLeafAgent(AgentBase):
         with tf.control_dependencies([assign_delta]):
             self.update_delta = ema.apply([delta])
 
+        # the same as running update_delta once for every delta of an episode, in order, in a single step
+        self.deltas_ = tf.placeholder(tf.float32, shape=[None], name='deltas_')
+        abs_deltas = tf.abs(self.deltas_)
+        num_deltas = tf.size(abs_deltas)
+        powers = decay ** tf.to_float(tf.range(num_deltas - 1, -1, -1))
+        average = ema.average(delta)
+        self.update_deltas = tf.group(tf.assign(delta, abs_deltas[-1]),
+                                      tf.assign(average, decay ** tf.to_float(num_deltas) * average +
+                                                (1 - decay) * tf.reduce_sum(powers * abs_deltas)))
+
         tf.summary.scalar("mean_delta", ema.average(delta))
 
+    def push_grad(self, grad_accum, grad, local_tvar, topk_ratio):
+        # Subtracts grad, computed on the worker, from grad_accum on the parameter server. Only the tensor
+        # consumed by the op colocated with grad_accum crosses the network.
+        size = grad_accum.get_shape().num_elements()
+        if self.grad_compression is None:
+            self.push_bytes_per_episode += 4 * size
+            return tf.assign_sub(grad_accum, grad)
+
+        elif self.grad_compression == 'float16':
+            self.push_bytes_per_episode += 2 * size
+            half_grad = tf.cast(grad, tf.float16)
+            with tf.colocate_with(grad_accum):
+                return tf.assign_sub(grad_accum, tf.cast(half_grad, tf.float32))
+
+        elif self.grad_compression == 'topk':
+            # the k largest entries of grad plus everything left over from earlier episodes are sent as
+            # float32 values and int32 indices, the rest is kept in a local residual (error feedback)
+            k = max(1, int(topk_ratio * size))
+            self.push_bytes_per_episode += 8 * k
+            with tf.device(local_tvar.device):
+                residual = tf.Variable(tf.zeros([size]), trainable=False,
+                                       collections=[tf.GraphKeys.LOCAL_VARIABLES],
+                                       name=local_tvar.op.name + '_residual')
+            corrected_grad = residual + tf.reshape(grad, [-1])
+            _, indices = tf.nn.top_k(tf.abs(corrected_grad), k, sorted=False)
+            indices = tf.expand_dims(indices, 1)
+            values = tf.gather_nd(corrected_grad, indices)
+            update_residual = tf.assign(residual, corrected_grad - tf.scatter_nd(indices, values, [size]))
+            with tf.colocate_with(grad_accum):
+                sparse_grad = tf.reshape(tf.scatter_nd(indices, values, [size]), grad_accum.get_shape())
+                return tf.group(update_residual, tf.assign_sub(grad_accum, sparse_grad))
+
+        else:
+            raise ValueError('unknown gradient compression: %s' % self.grad_compression)
+
     def train(self, num_moves=10, depth=1, pre_train=False):
-        self.sess.run(self.pull_global_model)
+        self.pull_model()
 
         lamda = 0.7
 
         self.env.random_position(episode_count=self.sess.run(self.train_episode_count))
-        self.ttable = dict()
-        self.killers = dict()
+        self.search.reset()
         # starting_position_move_str = ','.join([str(m) for m in self.env.get_move_stack()])
         # selected_moves = []
 
-        traces = [np.zeros(tvar.shape) for tvar in self.local_model.trainable_variables]
-        grad_accums = [np.zeros(tvar.shape) for tvar in self.local_model.trainable_variables]
-
-        turn_count = 0
-
-        previous_grads = None
-        previous_value = None
-        while self.env.get_reward() is None and turn_count < num_moves:
-
-            move, value, node = self.get_move(self.env, depth=depth, return_value_node=True, pre_train=pre_train)
-
-            feature_vector = self.env.make_feature_vector2(node.board)
-            grads = self.sess.run(self.grads, feed_dict={self.local_model.feature_vector_: feature_vector})
-
-            if pre_train:
-                delta = (np.tanh(material_value_from_board(node.board) / 5.0) - value)[0, 0]
-                for grad, grad_accum in zip(grads, grad_accums):
-                    grad_accum -= delta * grad
-                self.sess.run(self.update_delta, feed_dict={self.delta_: delta})
-            else:
-                if turn_count > 0:
-                    delta = (value - previous_value)[0, 0]
-                    for previous_grad, trace, grad_accum in zip(previous_grads, traces, grad_accums):
-                        trace *= lamda
-                        trace += previous_grad
-                        grad_accum -= delta * trace
-                    self.sess.run(self.update_delta, feed_dict={self.delta_: delta})
-                previous_grads = grads
-                previous_value = value
-
-            self.env.make_move(move)
-            turn_count += 1
-
-            new_killers = dict()
-            for killer_depth, killer_list in self.killers.items():
-                if killer_depth + 1 < depth:
-                    new_killers[killer_depth + 1] = killer_list
-            self.killers = new_killers
-
-            self.ttable = {key: row for key, row in self.ttable.items() if row['depth'] + 1 < depth}
-            for key, row in self.ttable.items():
-                row['depth'] = row['depth'] + 1
-                self.ttable[key] = row
-
-        self.sess.run([self.update_grad_accums_op, self.increment_episodes_since_apply_grad],
-                      feed_dict={grad_accum_: grad_accum
-                                 for grad_accum_, grad_accum in zip(self.grad_accum_s, grad_accums)})
+        feature_matrix, values, targets = play_episode(self.env, self.search,
+                                                       partial(self.get_move, return_value_node=True),
+                                                       num_moves, depth, pre_train)
+        leaf_weights, deltas = episode_leaf_weights(values, targets, lamda)
+
+        fetches = [self.update_grad_accums_from_episode, self.increment_episodes_since_apply_grad]
+        feed_dict = {self.local_model.feature_vector_: feature_matrix,
+                     self.leaf_weights_: np.reshape(leaf_weights, (-1, 1))}
+        if len(deltas) > 0:
+            fetches.append(self.update_deltas)
+            feed_dict[self.deltas_] = np.ravel(deltas)
+        self.sess.run(fetches, feed_dict=feed_dict)
 
         # selected_moves_string = ','.join([str(m) for m in selected_moves])
 
@@ -120,36 +152,37 @@ class TDLeafAgent(AgentBase):
         return self.env.get_reward()
 
     def get_move_pretrain(self, env):
-        node = Node('root', board=env.board, move=env.get_null_move())
-        moves = list(node.board.legal_moves)
-        children = []
-        for move in node.board.legal_moves:
-            child_board = node.board.copy()
-            child_board.push(move)
-            child = Node(str(move), parent=node, board=child_board, move=move)
-            children.append(child)
+        board = env.board.copy()
+        moves = list(board.legal_moves)
 
         values = []
-        for child in children:
-            values.append(material_value_from_board(child.board))
-        if node.board.turn:
+        for move in moves:
+            board.push(move)
+            values.append(material_value_from_board(board))
+            board.pop()
+        if board.turn:
             idx = np.argmax(values)
         else:
             idx = np.argmin(values)
         move = moves[idx]
         value = values[idx]
-        return move, value, node
+        return move, value, board
 
-    def get_move(self, env, depth=3, return_value_node=False, pre_train=False):
-        node = Node('root', board=env.board, move=env.get_null_move())
-        leaf_value, leaf_node = self.minimax(node, depth, -1, 1, self.local_model.value_function(self.sess), pre_train)
-        if len(leaf_node.path) > 1:
-            move = leaf_node.path[1].move
+    def get_move(self, env, depth=3, return_value_node=False, pre_train=False, time_limit=None, node_limit=None):
+        if self.parallel_search is not None and self.numpy_value_function is not None and depth > 1:
+            leaf_value, pv, leaf_board = self.parallel_search.search(env.board, depth, pre_train,
+                                                                     time_limit=time_limit, node_limit=node_limit)
+        else:
+            leaf_value, pv, leaf_board = self.search.search(env.board, depth,
+                                                            self.value_function(), pre_train,
+                                                            time_limit=time_limit, node_limit=node_limit)
+        if len(pv) > 0:
+            move = pv[0]
         else:
-            return env.get_null_move()
+            move = env.get_null_move()
 
         if return_value_node:
-            return move, leaf_value, leaf_node
+            return move, leaf_value, leaf_board
         else:
             return move
 
@@ -159,105 +192,60 @@ class TDLeafAgent(AgentBase):
             return move
         return m
 
-    def minimax(self, node, depth, alpha, beta, value_function, pre_train):
-
-        alpha_orig = alpha
-
-        hash_key = self.env.zobrist_hash(node.board)
-        tt_row = self.ttable.get(hash_key)
-        if tt_row is not None and tt_row['depth'] >= depth:
-            if tt_row['flag'] == 'EXACT':
-                return tt_row['value'], node
-            elif tt_row['flag'] == 'LOWERBOUND':
-                alpha = max(alpha, tt_row['value'])
-            elif tt_row['flag'] == 'UPPERBOUND':
-                beta = min(beta, tt_row['value'])
-            if alpha >= beta:
-                return tt_row['value'], node
-
-        if node.board.is_game_over():
-            if pre_train:
-                fv = self.env.make_feature_vector2(node.board)
-                value = value_function(fv)
-            else:
-                value = node.board.result()
-                if isinstance(value, str):
-                    value = convert_string_result(value)
-                else:
-                    value = np.array([[value]])
-            return value, node
-
-        elif depth <= 0 and self.env.is_quiet(node.board, depth):
-            fv = self.env.make_feature_vector2(node.board)
-            value = value_function(fv)
-            tt_row = {'value': value, 'flag': 'EXACT', 'depth': depth}
-            self.ttable[hash_key] = tt_row
-            return value, node
-
-        children = []
-        for move in node.board.legal_moves:
-            child_board = node.board.copy()
-            child_board.push(move)
-            child = Node(str(move), parent=node, board=child_board, move=move)
-            children.append(child)
-
-        children = self.env.sort_children(node, children, self.ttable, self.killers.get(depth, []) + self.killers.get(depth-2, []))
-
-        if node.board.turn:
-            best_v = -1
-            best_n = None
-            for child in children:
-                value, node = self.minimax(child, depth - 1, alpha, beta, value_function, pre_train)
-                if value >= best_v:
-                    best_v = value
-                    best_n = node
-                alpha = max(alpha, value)
-                if beta <= alpha:
-                    if self.killers.get(depth) is None:
-                        self.killers[depth] = [child.move, None]
-                    else:
-                        self.killers[depth] = [child.move, self.killers[depth][0]]
-                    break
-        else:
-            best_v = 1
-            best_n = None
-            for child in children:
-                value, node = self.minimax(child, depth - 1, alpha, beta, value_function, pre_train)
-                if value <= best_v:
-                    best_v = value
-                    best_n = node
-                beta = min(beta, value)
-                if beta <= alpha:
-                    if self.killers.get(depth) is None:
-                        self.killers[depth] = [child.move, None]
-                    else:
-                        self.killers[depth] = [child.move, self.killers[depth][0]]
-                    break
-
-        if tt_row is None:
-            tt_row = dict()
-        tt_row['value'] = best_v
-        if best_v <= alpha_orig:
-            tt_row['flag'] = 'UPPERBOUND'
-        elif best_v >= beta:
-            tt_row['flag'] = 'LOWERBOUND'
-        else:
-            tt_row['flag'] = 'EXACT'
-
-        tt_row['depth'] = depth
-        self.ttable[hash_key] = tt_row
 
-        return best_v, best_n
+def td_lambda_weights(deltas, lamda):
+    # Weight of the gradient of leaf k in the TD(lambda) update sum_t delta_t sum_{k<t} lamda^(t-1-k) grad_k,
+    # where deltas[t - 1] is the temporal difference between leaves t - 1 and t. Leaf k gets
+    # sum_{t>k} lamda^(t-1-k) delta_t, and the last leaf gets 0.
+    weights = np.zeros(len(deltas) + 1)
+    for k in range(len(deltas) - 1, -1, -1):
+        weights[k] = deltas[k] + lamda * weights[k + 1]
+    return weights
+
+
+def play_episode(env, search, get_move, num_moves=10, depth=1, pre_train=False):
+    # Plays up to num_moves moves from the current position of env. Returns the feature vectors and values of the
+    # leaves of the principal variations, and with pre_train their material targets.
+    feature_vectors = []
+    values = []
+    targets = []
+    turn_count = 0
+    while env.get_reward() is None and turn_count < num_moves:
+
+        move, value, leaf_board = get_move(env, depth=depth, pre_train=pre_train)
+
+        feature_vector = search.eval_cache.feature_vector(env.zobrist_hash(leaf_board))
+        if feature_vector is None:
+            feature_vector = env.make_feature_vector2(leaf_board)
+        feature_vectors.append(feature_vector)
+        values.append(value[0, 0])
+        if pre_train:
+            targets.append(np.tanh(material_value_from_board(leaf_board) / 5.0)[0, 0])
+
+        env.make_move(move)
+        turn_count += 1
+        search.age(depth)
+
+    if feature_vectors:
+        feature_matrix = np.vstack(feature_vectors)
+    else:
+        feature_matrix = np.zeros((0, env.get_feature_vector_size()))
+    return feature_matrix, np.array(values), np.array(targets) if pre_train else None
+
+
+def episode_leaf_weights(values, targets=None, lamda=0.7):
+    # weights of the leaf gradients in the update of an episode and its temporal differences
+    if targets is not None:
+        deltas = targets - values
+        return deltas, deltas
+    elif len(values) > 0:
+        deltas = np.diff(values)
+        return td_lambda_weights(deltas, lamda), deltas
+    else:
+        return np.zeros(0), np.zeros(0)
 
 
-def convert_string_result(string):
-    if string == '1-0':
-        return np.array([[1.0]])
-    elif string == '0-1':
-        return np.array([[-1.0]])
-    elif string == '1/2-1/2':
-        return np.array([[0.0]])
-    elif string == '*':
-        return None
-    else:
-        raise ValueError('Invalid result encountered')
+def lambda_returns(values, lamda=0.7):
+    # targets of the leaves of an episode: moving each value towards its target by gradient descent on the
+    # squared error gives the TD(lambda) update of episode_leaf_weights
+    return np.asarray(values) + episode_leaf_weights(values, None, lamda)[0]
@@ -0,0 +1,73 @@
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+
+
+class TrajectoryBuffer:
+    # Ring buffer in shared memory holding the leaf feature vectors and values of up to capacity episodes of at
+    # most max_length moves, with the reward of the episode (nan while it is unfinished) and the version of the
+    # weights that played it. Actor processes forked after creation put trajectories, blocking while the buffer
+    # is full, and the learner takes them out in order.
+    def __init__(self, capacity, max_length, fv_size):
+        context = get_context('fork')
+        self.capacity = capacity
+        self.max_length = max_length
+
+        self.features_memory = SharedMemory(create=True, size=4 * capacity * max_length * fv_size)
+        self.values_memory = SharedMemory(create=True, size=4 * capacity * max_length)
+        self.features = np.ndarray((capacity, max_length, fv_size), dtype=np.float32,
+                                   buffer=self.features_memory.buf)
+        self.values = np.ndarray((capacity, max_length), dtype=np.float32, buffer=self.values_memory.buf)
+        self.lengths = context.RawArray('i', capacity)
+        self.rewards = context.RawArray('d', capacity)
+        self.versions = context.RawArray('q', capacity)
+
+        self.head = context.RawValue('q', 0)
+        self.tail = context.RawValue('q', 0)
+        self.num_full_waits = context.RawValue('q', 0)
+        self.changed = context.Condition()
+
+    def __len__(self):
+        return self.head.value - self.tail.value
+
+    def put(self, feature_matrix, values, reward, version):
+        length = len(values)
+        with self.changed:
+            if len(self) >= self.capacity:
+                self.num_full_waits.value += 1
+                self.changed.wait_for(lambda: len(self) < self.capacity)
+            slot = self.head.value % self.capacity
+            self.features[slot, :length] = feature_matrix
+            self.values[slot, :length] = values
+            self.lengths[slot] = length
+            self.rewards[slot] = np.nan if reward is None else reward
+            self.versions[slot] = version
+            self.head.value += 1
+            self.changed.notify_all()
+
+    def get(self, num_trajectories, timeout=None):
+        # Waits until num_trajectories trajectories are in the buffer, or timeout seconds, and returns a list of
+        # (feature_matrix, values, reward, version) tuples; fewer than num_trajectories after a timeout.
+        with self.changed:
+            self.changed.wait_for(lambda: len(self) >= num_trajectories, timeout)
+            trajectories = []
+            for idx in range(self.tail.value, self.tail.value + min(num_trajectories, len(self))):
+                slot = idx % self.capacity
+                length = self.lengths[slot]
+                reward = self.rewards[slot]
+                trajectories.append((self.features[slot, :length].copy(), self.values[slot, :length].copy(),
+                                     None if np.isnan(reward) else reward, self.versions[slot]))
+            self.tail.value += len(trajectories)
+            self.changed.notify_all()
+        return trajectories
+
+    def stats(self):
+        return {'trajectories': self.head.value,
+                'size': len(self),
+                'full_waits': self.num_full_waits.value}
+
+    def close(self):
+        self.features = self.values = None
+        for memory in [self.features_memory, self.values_memory]:
+            memory.close()
+            memory.unlink()
@@ -0,0 +1,80 @@
+import numpy as np
+
+EMPTY = 0
+EXACT = 1
+LOWERBOUND = 2
+UPPERBOUND = 3
+
+
+class TranspositionTable:
+    # Two-entry buckets: slot 0 is depth-preferred, slot 1 is always-replace. Entries from older generations
+    # (earlier moves of the game) are still probed, but are the first to be overwritten.
+    entry_bytes = 8 + 4 + 1 + 1 + 1 + 2
+
+    def __init__(self, size_mb=16):
+        self.size_mb = size_mb
+        self.num_buckets = max(1, int(size_mb * 2 ** 20 / (2 * self.entry_bytes)))
+        shape = (self.num_buckets, 2)
+
+        self.keys = np.zeros(shape, dtype=np.uint64)
+        self.values = np.zeros(shape, dtype=np.float32)
+        self.depths = np.zeros(shape, dtype=np.int8)
+        self.flags = np.zeros(shape, dtype=np.uint8)
+        self.generations = np.zeros(shape, dtype=np.uint8)
+        self.moves = np.zeros(shape, dtype=np.uint16)
+
+        self.generation = 0
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in [self.keys, self.values, self.depths, self.flags, self.generations, self.moves])
+
+    def clear(self):
+        self.flags.fill(EMPTY)
+        self.generation = 0
+
+    def new_search(self):
+        self.generation = (self.generation + 1) % 256
+
+    def probe(self, key):
+        bucket = key % self.num_buckets
+        key = np.uint64(key)
+        for slot in range(2):
+            if self.flags[bucket, slot] != EMPTY and self.keys[bucket, slot] == key:
+                return (float(self.values[bucket, slot]),
+                        int(self.flags[bucket, slot]),
+                        int(self.depths[bucket, slot]),
+                        int(self.moves[bucket, slot]))
+        return None
+
+    def store(self, key, value, flag, depth, move=0):
+        bucket = key % self.num_buckets
+        key = np.uint64(key)
+
+        if move == 0:
+            # keep the best move from a previous search of the same position
+            for slot in range(2):
+                if self.flags[bucket, slot] != EMPTY and self.keys[bucket, slot] == key:
+                    move = self.moves[bucket, slot]
+
+        first_empty = self.flags[bucket, 0] == EMPTY
+        first_same = not first_empty and self.keys[bucket, 0] == key
+        if (first_empty or first_same or self.generations[bucket, 0] != self.generation or
+                depth >= self.depths[bucket, 0]):
+            if first_empty or first_same:
+                if self.keys[bucket, 1] == key:
+                    self.flags[bucket, 1] = EMPTY
+            else:
+                self._write(bucket, 1, self.keys[bucket, 0], self.values[bucket, 0], self.flags[bucket, 0],
+                            self.depths[bucket, 0], self.moves[bucket, 0], self.generations[bucket, 0])
+            self._write(bucket, 0, key, value, flag, depth, move, self.generation)
+        else:
+            self._write(bucket, 1, key, value, flag, depth, move, self.generation)
+
+    def _write(self, bucket, slot, key, value, flag, depth, move, generation):
+        self.keys[bucket, slot] = key
+        self.values[bucket, slot] = value
+        self.flags[bucket, slot] = flag
+        self.depths[bucket, slot] = depth
+        self.moves[bucket, slot] = move
+        self.generations[bucket, slot] = generation
@@ -0,0 +1,48 @@
+import argparse
+import time
+import numpy as np
+from agents.lockstep_runner import LockstepRunner
+from envs.chess import ChessEnv
+from envs.tic_tac_toe import TicTacToeEnv
+from value_model import NumpyValueFunction
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--env", choices=['tictactoe', 'chess'], default='tictactoe')
+    parser.add_argument("--num_envs", type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument("--games", type=int, default=40, help="games per side against the random player")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--call_overhead_ms", type=float, default=0.0,
+                        help="fixed latency added to every inference call, e.g. that of a session call")
+    args = parser.parse_args()
+
+    if args.env == 'chess':
+        make_env = lambda: ChessEnv(load_pgn=False)
+        fv_size = ChessEnv.get_feature_vector_size()
+    else:
+        make_env = TicTacToeEnv
+        fv_size = TicTacToeEnv.get_feature_vector_size()
+
+    rng = np.random.RandomState(0)
+    numpy_value_function = NumpyValueFunction(rng.normal(scale=0.1, size=(fv_size, 1000)),
+                                              rng.normal(scale=0.03, size=(1000, 1000)),
+                                              rng.normal(scale=0.03, size=(1000, 1)))
+
+    def value_function(fv):
+        if args.call_overhead_ms > 0:
+            time.sleep(args.call_overhead_ms / 1000)
+        return numpy_value_function(fv)
+
+    for num_envs in args.num_envs:
+        runner = LockstepRunner([make_env() for _ in range(num_envs)])
+        result = runner.random_agent_test(value_function, depth=args.depth, num_games=args.games)
+        print("ENVS:", num_envs,
+              "GAMES/SEC: %.2f" % runner.stats['games_per_sec'],
+              "INFERENCE CALLS:", runner.stats['inference_calls'],
+              "ROWS/CALL: %.1f" % runner.stats['rows_per_call'],
+              "RESULT:", result)
+
+
+if __name__ == "__main__":
+    main()
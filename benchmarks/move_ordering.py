@@ -0,0 +1,57 @@
+import argparse
+import time
+import chess
+import numpy as np
+from agents.search import AlphaBetaSearch
+from envs.chess import ChessEnv, parse_test_string, read_test_strings
+
+
+def make_value_function(seed=0):
+    # material balance plus small fixed random weights so that equal-material positions are not all tied
+    weights = ChessEnv.get_material_value_weights() + \
+        np.random.RandomState(seed).normal(scale=0.05, size=(ChessEnv.get_feature_vector_size(), 1))
+
+    def f(fv):
+        return np.tanh(np.dot(fv, weights) / 5.0)
+    return f
+
+
+def run(search, fens, depth, value_function):
+    total_nodes = 0
+    total_cutoffs = 0
+    total_first_move_cutoffs = 0
+    t0 = time.time()
+    for fen in fens:
+        search.reset()
+        search.search(chess.Board(fen), depth, value_function)
+        total_nodes += search.nodes
+        total_cutoffs += search.cutoffs
+        total_first_move_cutoffs += search.first_move_cutoffs
+    elapsed = time.time() - t0
+    first_move_cutoff_rate = total_first_move_cutoffs / max(total_cutoffs, 1)
+    return total_nodes, first_move_cutoff_rate, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--num_positions", type=int, default=20)
+    args = parser.parse_args()
+
+    _, test_strings = read_test_strings("./chess_tests/")
+    step = max(len(test_strings) // args.num_positions, 1)
+    fens = [parse_test_string(string)['fen'] for string in test_strings[::step][:args.num_positions]]
+
+    env = ChessEnv(load_pgn=False)
+    value_function = make_value_function()
+    for name, ordering_heuristics in [('killers+mvv_lva', False), ('full', True)]:
+        search = AlphaBetaSearch(env, ordering_heuristics=ordering_heuristics)
+        nodes, first_move_cutoff_rate, elapsed = run(search, fens, args.depth, value_function)
+        print(name,
+              "NODES:", nodes,
+              "FIRST MOVE CUTOFF RATE: %.3f" % first_move_cutoff_rate,
+              "TIME: %.2fs" % elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import time
+import chess
+from envs.chess import ChessEnv, parse_test_string, read_test_strings, min_attacker_value, \
+    static_exchange_evaluation, is_losing_capture
+
+
+def old_is_losing_capture(board, move):
+    # the approximation used by the old ChessEnv.is_quiet
+    if board.is_en_passant(move):
+        return False
+    return board.piece_type_at(move.from_square) > board.piece_type_at(move.to_square)
+
+
+def time_per_call(f, board_moves, repeat):
+    t0 = time.time()
+    for _ in range(repeat):
+        for board, move in board_moves:
+            f(board, move)
+    return (time.time() - t0) / (repeat * len(board_moves)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    _, test_strings = read_test_strings("./chess_tests/")
+    board_moves = []
+    for string in test_strings:
+        board = chess.Board(parse_test_string(string)['fen'])
+        for move in board.generate_legal_captures():
+            board_moves.append((board, move))
+
+    helpers = [('static_exchange_evaluation', static_exchange_evaluation),
+               ('is_losing_capture', is_losing_capture),
+               ('old is_quiet heuristic', old_is_losing_capture),
+               ('mmv_lva', ChessEnv.mmv_lva),
+               ('min_attacker_value', lambda board, move: min_attacker_value(board, move.to_square, not board.turn))]
+    print("CAPTURES:", len(board_moves))
+    for name, f in helpers:
+        print(name, "%.2f us/call" % time_per_call(f, board_moves, args.repeat))
+
+    losing = sum(static_exchange_evaluation(board, move) < 0 for board, move in board_moves)
+    disagreements = sum((static_exchange_evaluation(board, move) < 0) != old_is_losing_capture(board, move)
+                        for board, move in board_moves)
+    print("LOSING CAPTURES BY SEE:", losing, "DISAGREEMENTS WITH OLD HEURISTIC:", disagreements)
+
+
+if __name__ == "__main__":
+    main()
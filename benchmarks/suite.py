@@ -0,0 +1,221 @@
+import argparse
+import hashlib
+import json
+import platform
+import subprocess
+import sys
+import time
+from functools import partial
+import chess
+import chess.pgn
+import numpy as np
+from agents.search import AlphaBetaSearch
+from envs.chess import ChessEnv, parse_test_string, read_test_strings
+
+BENCHMARKS = ['feature_vector', 'feature_matrix', 'zobrist_hash', 'value_function', 'search', 'train', 'local_train']
+
+
+class FixedPositions:
+    # position_sampler that hands out the benchmark positions in order
+    def __init__(self, boards):
+        self.boards = boards
+        self.idx = 0
+
+    def sample(self, episode_count=None):
+        board = self.boards[self.idx % len(self.boards)].copy()
+        self.idx += 1
+        return board
+
+
+def load_boards(test_path, pgn_path, pgn_games):
+    _, test_strings = read_test_strings(test_path)
+    boards = [chess.Board(parse_test_string(string)['fen']) for string in test_strings]
+    if pgn_path is not None:
+        with open(pgn_path) as pgn:
+            for _ in range(pgn_games):
+                game = chess.pgn.read_game(pgn)
+                if game is None:
+                    break
+                board = game.board()
+                for move in game.mainline_moves():
+                    board.push(move)
+                    boards.append(board.copy(stack=False))
+    return boards
+
+
+def make_value_function(seed=0):
+    # fixed random weights of the full size, scaled like the xavier initialization of ValueModel
+    from value_model import ValueModel, NumpyValueFunction
+    rng = np.random.RandomState(seed)
+    return NumpyValueFunction(*[rng.normal(scale=np.sqrt(1.0 / shape[0]), size=shape)
+                                for shape in ValueModel.get_weight_shapes()])
+
+
+def per_sec(f, items, min_time):
+    # calls f on every item, repeating the pass until min_time seconds have passed
+    num_calls = 0
+    t0 = time.time()
+    while True:
+        for item in items:
+            f(item)
+        num_calls += len(items)
+        elapsed = time.time() - t0
+        if elapsed >= min_time:
+            return num_calls / elapsed
+
+
+def bench_feature_vector(boards, args):
+    return {'feature_vectors_per_sec': per_sec(ChessEnv.make_feature_vector2, boards, args.min_time)}
+
+
+def bench_feature_matrix(boards, args):
+    batches = [boards[start:start + 256] for start in range(0, len(boards), 256)]
+    batches_per_sec = per_sec(ChessEnv.make_feature_matrix, batches, args.min_time)
+    return {'feature_matrix_rows_per_sec': batches_per_sec * len(boards) / len(batches)}
+
+
+def bench_zobrist_hash(boards, args):
+    env = ChessEnv(load_pgn=False)
+    return {'zobrist_hashes_per_sec': per_sec(env.zobrist_hash, boards, args.min_time)}
+
+
+def bench_value_function(boards, args):
+    value_function = make_value_function()
+    fvs = ChessEnv.make_feature_matrix(boards[:1024]).astype(np.float32)
+    fvs = np.vstack([fvs] * (1024 // len(fvs) + 1))[:1024]
+    rows_per_sec = dict()
+    for batch_size in [1, 4, 16, 64, 256, 1024]:
+        batches = [fvs[start:start + batch_size] for start in range(0, 1024, batch_size)]
+        rows_per_sec[str(batch_size)] = per_sec(value_function, batches, args.min_time) * batch_size
+    return {'value_rows_per_sec': rows_per_sec}
+
+
+def bench_search(boards, args):
+    env = ChessEnv(load_pgn=False)
+    value_function = make_value_function()
+    step = max(len(boards) // args.search_positions, 1)
+    search_boards = boards[::step][:args.search_positions]
+
+    nodes = dict()
+    nodes_per_sec = dict()
+    time_to_depth = dict()
+    for depth in range(1, args.depth + 1):
+        search = AlphaBetaSearch(env)
+        num_nodes = 0
+        t0 = time.time()
+        for board in search_boards:
+            search.reset()
+            search.search(board, depth, value_function)
+            num_nodes += search.nodes
+        elapsed = time.time() - t0
+        nodes[str(depth)] = num_nodes
+        nodes_per_sec[str(depth)] = num_nodes / elapsed
+        time_to_depth[str(depth)] = elapsed / len(search_boards)
+    return {'search_positions': len(search_boards),
+            'search_nodes': nodes,
+            'nodes_per_sec': nodes_per_sec,
+            'time_to_depth_sec': time_to_depth}
+
+
+def bench_train(boards, args):
+    # TDLeafAgent.train with a plain session: search, one gradient call and the push to the accumulators
+    import tensorflow as tf
+    from agents.td_leaf_agent import TDLeafAgent
+    from value_model import ValueModel
+    with tf.Graph().as_default():
+        tf.set_random_seed(0)
+        env = ChessEnv(load_pgn=False, position_sampler=FixedPositions(boards[::max(len(boards) // 100, 1)]))
+        with tf.variable_scope('local'):
+            local_network = ValueModel(is_local=True)
+        network = ValueModel()
+        agent = TDLeafAgent('benchmark', network, local_network, env)
+        with tf.Session() as sess:
+            sess.run([tf.global_variables_initializer(), tf.local_variables_initializer()])
+            agent.sess = sess
+            agent.train(num_moves=args.num_moves, depth=args.train_depth)
+            t0 = time.time()
+            for _ in range(args.episodes):
+                agent.train(num_moves=args.num_moves, depth=args.train_depth)
+            elapsed = time.time() - t0
+    return {'train_episodes_per_sec': args.episodes / elapsed}
+
+
+def bench_local_train(boards, args):
+    # the episode of a local_train.py trainer: search with the NumPy value function and NumPy gradients
+    from agents.td_leaf_agent import play_episode, episode_leaf_weights
+    from local_train import search_move
+    env = ChessEnv(load_pgn=False, position_sampler=FixedPositions(boards[::max(len(boards) // 100, 1)]))
+    search = AlphaBetaSearch(env)
+    value_function = make_value_function()
+
+    def episode():
+        env.random_position()
+        search.reset()
+        feature_matrix, values, _ = play_episode(env, search, partial(search_move, search, value_function),
+                                                 args.num_moves, args.train_depth)
+        value_function.weighted_gradients(feature_matrix, episode_leaf_weights(values)[0])
+
+    episode()
+    t0 = time.time()
+    for _ in range(args.episodes):
+        episode()
+    return {'local_train_episodes_per_sec': args.episodes / (time.time() - t0)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default=None, help="file the JSON results are written to, besides stdout")
+    parser.add_argument("--benchmarks", nargs='+', choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--test_path", default="./chess_tests/")
+    parser.add_argument("--pgn", default="./benchmarks/sample_games.pgn",
+                        help="PGN whose first games are added to the positions, 'none' for the test positions only")
+    parser.add_argument("--pgn_games", type=int, default=10)
+    parser.add_argument("--min_time", type=float, default=1.0, help="seconds per micro-benchmark")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--search_positions", type=int, default=10)
+    parser.add_argument("--train_depth", type=int, default=3)
+    parser.add_argument("--num_moves", type=int, default=10)
+    parser.add_argument("--episodes", type=int, default=5)
+    args = parser.parse_args()
+
+    pgn_path = None if args.pgn == 'none' else args.pgn
+    boards = load_boards(args.test_path, pgn_path, args.pgn_games)
+    # results are only comparable for the same positions
+    if pgn_path is not None:
+        with open(pgn_path, 'rb') as f:
+            pgn_sha256 = hashlib.sha256(f.read()).hexdigest()
+    else:
+        pgn_sha256 = None
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    results = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'commit': commit,
+               'python': sys.version.split()[0],
+               'numpy': np.__version__,
+               'chess': chess.__version__,
+               'machine': platform.machine(),
+               'positions': len(boards),
+               'pgn': pgn_path,
+               'pgn_sha256': pgn_sha256,
+               'args': vars(args)}
+    # benchmarks of the value model need TensorFlow, which value_model.py imports; without it they are skipped
+    results['skipped'] = dict()
+    for name in BENCHMARKS:
+        if name in args.benchmarks:
+            try:
+                results.update(globals()['bench_' + name](boards, args))
+            except ImportError as e:
+                results['skipped'][name] = str(e)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    print(output)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+from envs.position_store import build
+import argparse
+import time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pgn", default="./data/millionbase-2.22.pgn")
+    parser.add_argument("--output", default="./data/positions/")
+    parser.add_argument("--max_games", type=int, default=None)
+    args = parser.parse_args()
+
+    t0 = time.time()
+    with open(args.pgn) as pgn:
+        num_games, num_positions = build(pgn, args.output, args.max_games)
+    print("GAMES:", num_games, "POSITIONS:", num_positions, "TIME: %.1fs" % (time.time() - t0))
@@ -0,0 +1,17 @@
+from envs.pretrain_dataset import build
+import argparse
+import time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--positions", default="./data/positions/", help="store written by build_position_store.py")
+    parser.add_argument("--output", default="./data/pretrain/")
+    parser.add_argument("--num_positions", type=int, default=None)
+    parser.add_argument("--shard_size", type=int, default=2 ** 18)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    t0 = time.time()
+    num_positions = build(args.positions, args.output, args.num_positions, args.shard_size, args.processes)
+    print("POSITIONS:", num_positions, "TIME: %.1fs" % (time.time() - t0))
@@ -3,17 +3,29 @@ import chess
 from chess.polyglot import zobrist_hash
 from chess.pgn import read_game
 from random import choice, randint
+from os import listdir
+from os.path import isfile, isdir, join
 from .game_env_base import GameEnvBase
+from .position_store import PositionStore
 import pandas as pd
+from collections import Counter
 
 
 class ChessEnv(GameEnvBase):
 
-    def __init__(self):
+    def __init__(self, load_pgn=True, position_store="./data/positions/", position_sampler=None):
         self.board = chess.Board()
 
-        pgn = open("./data/millionbase-2.22.pgn")
-        self.board_generator = self.random_board_generator(pgn)
+        # positions come from a shared background PositionSampler if one is given, else from the store written
+        # by build_position_store.py if it exists, else from the pgn
+        self.position_sampler = position_sampler
+        self.position_store = None
+        if load_pgn and position_sampler is None:
+            if position_store is not None and isdir(position_store):
+                self.position_store = PositionStore(position_store)
+            else:
+                pgn = open("./data/millionbase-2.22.pgn")
+                self.board_generator = self.random_board_generator(pgn)
 
         self.tests = []
         # path = "./old_chess_tests/"
@@ -37,6 +49,12 @@ class ChessEnv(GameEnvBase):
         self.board = chess.Board(fen)
 
     def random_position(self, episode_count=None):
+        if self.position_sampler is not None:
+            self.board = self.position_sampler.sample(episode_count)
+            return
+        if self.position_store is not None:
+            self.board = self.position_store.sample(episode_count)
+            return
         self.episode_count_ = episode_count
         for _ in range(randint(1, 100)):
             self.board = self.board_generator.__next__()
@@ -85,51 +103,63 @@ class ChessEnv(GameEnvBase):
         return feature_vector
 
     @staticmethod
-    def is_quiet(board, depth):
-        parent_board = board.copy()
-        move = parent_board.pop()
-
-        # if depth > -2:
-        #     is_check = board.is_check()
-        #     parent_is_check = parent_board.is_check()
-        # else:
-        #     is_check = False
-        #     parent_is_check = False
-
-        is_check = board.is_check()
-
-        if parent_board.is_capture(move) and not parent_board.is_en_passant(move):
-            capturing_piece_type = parent_board.piece_type_at(move.from_square)
-            captured_piece_type = parent_board.piece_type_at(move.to_square)
-            is_losing_capture = (capturing_piece_type > captured_piece_type)
-        else:
-            is_losing_capture = False
-
-        is_promotion = move.promotion is not None
+    def is_check(board):
+        return board.is_check()
 
-        return not (is_losing_capture or is_promotion or is_check) # or parent_is_check)
+    @staticmethod
+    def get_noisy_moves(board):
+        # moves searched by quiescence: every evasion when in check, otherwise captures and promotions that do
+        # not lose material by static exchange evaluation
+        if board.is_check():
+            return list(board.legal_moves)
+        moves = list(board.generate_legal_captures())
+        promotion_mask = chess.BB_RANK_8 if board.turn else chess.BB_RANK_1
+        for move in board.generate_legal_moves(from_mask=board.pawns, to_mask=promotion_mask & ~board.occupied):
+            moves.append(move)
+        return [move for move in moves if not is_losing_capture(board, move)]
 
-    def sort_children(self, parent, children, ttable, killers):
-        hashed_nodes = []
-        in_killers = []
+    @staticmethod
+    def material_gain(board, move):
+        # material won by move in pawns, used for delta pruning
+        if board.is_en_passant(move):
+            gain = 1
+        else:
+            gain = piece_type_to_value[board.piece_type_at(move.to_square) or 0]
+        if move.promotion is not None:
+            gain += piece_type_to_value[move.promotion] - 1
+        return gain
+
+    def sort_moves(self, board, moves, hash_move=None, killers=(), countermove=None, history=None):
+        # hash move, winning and equal captures (MVV-LVA), killers, countermove, quiet moves by history score,
+        # then captures that lose material by static exchange evaluation
+        hashed = []
         captures = []
+        in_killers = []
+        counters = []
         others = []
-
-        tt_row = ttable.get(parent.board.fen())
-        for child in children:
-            if tt_row is not None:
-                hashed_nodes.append(child.move)
-            elif child.move in killers:
-                in_killers.append(child)
-            elif parent.board.is_capture(child.move):
-                captures.append(child)
-
+        losing_captures = []
+
+        for move in moves:
+            if move == hash_move:
+                hashed.append(move)
+            elif board.is_capture(move):
+                if is_losing_capture(board, move):
+                    losing_captures.append(move)
+                else:
+                    captures.append(move)
+            elif move in killers:
+                in_killers.append(move)
+            elif move == countermove:
+                counters.append(move)
             else:
-                others.append(child)
+                others.append(move)
 
-        captures = sorted(captures, key=lambda node: self.mmv_lva(node.parent.board, node.move))
-        hashed_nodes = sorted(hashed_nodes, key=lambda node: ttable[self.zobrist_hash(node.board)]['value'], reverse=not parent.board.turn)
-        return hashed_nodes + in_killers + captures + others
+        captures = sorted(captures, key=lambda move: self.mmv_lva(board, move))
+        if history:
+            turn = board.turn
+            others = sorted(others, key=lambda move: -history.get((turn, self.encode_move(move)), 0))
+        losing_captures = sorted(losing_captures, key=lambda move: -static_exchange_evaluation(board, move))
+        return hashed + captures + in_killers + counters + others + losing_captures
 
     @staticmethod
     def mmv_lva(board, move):
@@ -139,7 +169,7 @@ class ChessEnv(GameEnvBase):
         else:
             aggressor = board.piece_type_at(move.from_square)
             victim = board.piece_type_at(move.to_square)
-        return int(str(6 - victim) + str(aggressor - 1))
+        return 10 * (6 - victim) + aggressor - 1
 
     def get_test(self, test_idx):
         df, _ = self.tests[test_idx]
@@ -170,6 +200,18 @@ class ChessEnv(GameEnvBase):
     def zobrist_hash(self, board):
         return zobrist_hash(board)
 
+    @staticmethod
+    def encode_move(move):
+        # 16 bit move code for the transposition table, 0 is the null move
+        return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+    @staticmethod
+    def decode_move(code):
+        if code == 0:
+            return chess.Move.null()
+        promotion = code >> 12
+        return chess.Move(code & 63, (code >> 6) & 63, promotion=promotion if promotion else None)
+
     def random_board_generator(self, pgn, decay=5000):
         while True:
             game = read_game(pgn)
@@ -188,24 +230,75 @@ class ChessEnv(GameEnvBase):
                 pgn.seek(0)
 
     @staticmethod
-    def make_feature_vector2(board):
-        fv = np.zeros((1, 171))
-        from_squares = [move.from_square for move in board.legal_moves]
-        white_pawn_features, white_pawn_material = pawn_features(board, 1, from_squares)
-        white_pair_piece_features, white_pair_material = pair_piece_features(board, 1, from_squares)
-        white_queen_king_features, white_queen_king_material = queen_king_features(board, 1, from_squares)
-        black_pawn_features, black_pawn_material = pawn_features(board, 0, from_squares)
-        black_pair_piece_features, black_pair_material = pair_piece_features(board, 0, from_squares)
-        black_queen_king_features, black_queen_king_material = queen_king_features(board, 0, from_squares)
-        features = white_pawn_features + white_pair_piece_features + white_queen_king_features + black_pawn_features + black_pair_piece_features + black_queen_king_features
-        material = white_pawn_material + white_pair_material + white_queen_king_material[:1] + black_pawn_material + black_pair_material + black_queen_king_material[:1]
-        for idx, feature in enumerate(features):
-            fv[0, 5 * idx:5 * (idx + 1)] = feature
-        fv[0, -11] = board.turn
-
-        fv[0, -10:] = material
+    def make_feature_vector2(board, attacker_value=None, from_squares=None):
+        if attacker_value is None:
+            attacker_value = min_attacker_value
+        if from_squares is None:
+            from_squares = Counter(move.from_square for move in board.legal_moves)
+        row = []
+        material = []
+        for side in (1, 0):
+            slots, side_material = piece_slots(board, side)
+            material.extend(side_material)
+            for slot in range(16):
+                if slot in slots:
+                    square, max_mobility = slots[slot]
+                    row.extend([(square % 8) / 8,
+                                int(square / 8) / 8,
+                                attacker_value(board, square, side),
+                                attacker_value(board, square, not side),
+                                from_squares.get(square, 0) / max_mobility])
+                else:
+                    row.extend([0, 0, 0, 0, 0])
+        row.append(board.turn)
+        row.extend(material)
+        fv = np.array([row], dtype=np.float64)
         return fv
 
+    @staticmethod
+    def make_feature_matrix(boards):
+        # batched make_feature_vector2: attack maps for all boards are computed with NumPy bitboard operations,
+        # only slot assignment and legal move counting are done per board
+        num_boards = len(boards)
+        masks = np.array([[board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK],
+                           board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings]
+                          for board in boards], dtype=np.uint64).reshape((num_boards, 8))
+        attacker_types = min_attacker_types(masks)
+        attacker_values = piece_values[attacker_types]
+        attacker_values[:, int(chess.BLACK)] *= -1
+
+        squares = np.zeros((num_boards, 2, 16), dtype=np.int64)
+        occupied_slots = np.zeros((num_boards, 2, 16), dtype=bool)
+        max_mobility = np.ones((num_boards, 2, 16))
+        mobility = np.zeros((num_boards, 64))
+        fm = np.zeros((num_boards, 171))
+        for i, board in enumerate(boards):
+            for square, count in legal_move_counts(board).items():
+                mobility[i, square] = count
+            for side in (1, 0):
+                slots, material = piece_slots(board, side)
+                for slot, (square, normaliser) in slots.items():
+                    squares[i, 1 - side, slot] = square
+                    occupied_slots[i, 1 - side, slot] = True
+                    max_mobility[i, 1 - side, slot] = normaliser
+                fm[i, 161 + 5 * (1 - side):166 + 5 * (1 - side)] = material
+            fm[i, 160] = board.turn
+
+        rows = np.arange(num_boards)[:, None, None]
+        sides = np.array([1, 0])[None, :, None]
+        features = np.stack([(squares % 8) / 8,
+                             (squares // 8) / 8,
+                             attacker_values[rows, sides, squares],
+                             attacker_values[rows, 1 - sides, squares],
+                             mobility[rows, squares] / max_mobility], axis=-1)
+        features[~occupied_slots] = 0
+        fm[:, :160] = features.reshape((num_boards, 160))
+        return fm.astype(np.float32)
+
+    @staticmethod
+    def make_feature_accumulator(board):
+        return FeatureAccumulator(board)
+
 
 def board_generator(pgn):
     while True:
@@ -247,6 +340,37 @@ def material_value_from_board(board):
     return np.array([[value]])
 
 
+def parse_test_string(string):
+    data = [s for s in string.split('; ')]
+    d = dict()
+    d['fen'] = data[0].split(' bm ')[0] + " 0 0"
+    d['bm'] = data[0].split(' bm ')[1]
+
+    for c in data[1:]:
+        c = c.replace('"', '')
+        c = c.replace(';', '')
+        item = c.split(maxsplit=1, sep=" ")
+        d[item[0]] = item[1]
+
+    move_rewards = {}
+    answers = d['c0'].split(',')
+    for answer in answers:
+        move_reward = answer.split('=')
+        move_rewards[move_reward[0].strip()] = int(move_reward[1])
+    d['c0'] = move_rewards
+    return d
+
+
+def read_test_strings(test_path="./chess_tests/"):
+    test_filenames = sorted([f for f in listdir(test_path) if isfile(join(test_path, f))])
+    test_strings = []
+    for filename in test_filenames:
+        with open(test_path + filename) as f:
+            for string in f:
+                test_strings.append(string.strip())
+    return test_filenames, test_strings
+
+
 def parse_tests(filename):
     with open(filename, "r") as f:
         tests = f.readlines()
@@ -279,44 +403,34 @@ def parse_tests(filename):
 max_mobilities = {1: 3.0, 2: 8.0, 3: 13.0, 4: 14.0, 5: 27.0, 6: 8.0}
 
 
-def pawn_features(board, side, from_squares):
-    features = [[0, 0, 0, 0, 0]] * 8
+def pawn_slots(board, side):
+    slots = dict()
     material = []
     empty_slots = set(range(8))
     unplaced_squares = set()
     squares = set(board.pieces(1, side))
     material.append(len(squares)/8.0)
-    for i, square in enumerate(squares):
+    for square in squares:
         file = square % 8
         if file in empty_slots:
-            rank = int(square / 8)
-            file = square % 8
             slot = file
             empty_slots.remove(slot)
-            min_attacker = min_attacker_value(board, square, not side)
-            min_defender = min_attacker_value(board, square, side)
-            mobility = sum([square == from_square for from_square in from_squares]) / 27.0
-            features[slot] = [file/8, rank/8, min_defender, min_attacker, mobility]
+            slots[slot] = (square, 27.0)
         else:
             unplaced_squares.add(square)
 
     empty_slots = list(empty_slots)
-    for i, square in enumerate(unplaced_squares):
-        rank = int(square / 8)
+    for square in unplaced_squares:
         file = square % 8
         dists = [(slot - file)**2 for slot in empty_slots]
         slot = empty_slots[np.argmin(dists)]
         empty_slots.remove(slot)
-
-        min_attacker = min_attacker_value(board, square, not side)
-        min_defender = min_attacker_value(board, square, side)
-        mobility = sum([square == from_square for from_square in from_squares]) / max_mobilities[1]
-        features[slot] = [file/8, rank/8, min_defender, min_attacker, mobility]
-    return features, material
+        slots[slot] = (square, max_mobilities[1])
+    return slots, material
 
 
-def pair_piece_features(board, side, from_squares):
-    features = [[0, 0, 0, 0, 0]] * 6
+def pair_piece_slots(board, side):
+    slots = dict()
     material = []
     for piece in range(2, 5):
         squares = list(board.pieces(piece, side))[:2]
@@ -329,32 +443,39 @@ def pair_piece_features(board, side, from_squares):
                 slot = (file + rank % 2) % 2 + (piece - 2) * 2
             else:
                 slot = i + (piece - 2) * 2
-            min_attacker = min_attacker_value(board, square, not side)
-            min_defender = min_attacker_value(board, square, side)
-            mobility = sum([square == from_square for from_square in from_squares]) / max_mobilities[piece]
-            features[slot] = [file/8, rank/8, min_defender, min_attacker, mobility]
-    return features, material
+            slots[slot] = (square, max_mobilities[piece])
+    return slots, material
 
 
-def queen_king_features(board, side, from_squares):
-    features = [[0, 0, 0, 0, 0]] * 2
+def queen_king_slots(board, side):
+    slots = dict()
     material = []
     for piece in range(5, 7):
         slot = piece - 5
         squares = list(board.pieces(piece, side))
         material.append(len(squares))
         for square in squares[:1]:
-            rank = int(square / 8)
-            file = square % 8
-            min_attacker = min_attacker_value(board, square, not side)
-            min_defender = min_attacker_value(board, square, side)
-            mobility = sum([square == from_square for from_square in from_squares]) / max_mobilities[piece]
-            features[slot] = [file/8, rank/8, min_defender, min_attacker, mobility]
-    return features, material
+            slots[slot] = (square, max_mobilities[piece])
+    return slots, material
+
+
+def piece_slots(board, side):
+    # maps each of the 16 feature slots of one side (8 pawns, 2 knights, 2 bishops, 2 rooks, queen, king) to the
+    # square of the piece it describes and the normaliser of its mobility, plus the material features of the side
+    slots, pawn_material = pawn_slots(board, side)
+    pair_slots, pair_material = pair_piece_slots(board, side)
+    king_slots, queen_king_material = queen_king_slots(board, side)
+    for slot, value in pair_slots.items():
+        slots[slot + 8] = value
+    for slot, value in king_slots.items():
+        slots[slot + 14] = value
+    return slots, pawn_material + pair_material + queen_king_material[:1]
+
+
+piece_type_to_value = {0: 0, 1: 1, 2: 3, 3: 3, 4: 5, 5: 9, 6: 15}
 
 
 def min_attacker_value(board, square, side):
-    piece_type_to_value = {0: 0, 1: 1, 2: 3, 3: 3, 4: 5, 5: 9, 6: 15}
     attacker_squares = board.attackers(side, square)
     attacker_piece_types = []
     for attacker_square in attacker_squares:
@@ -369,3 +490,272 @@ def min_attacker_value(board, square, side):
     else:
         return -piece_type_to_value[min_attacker_type] / 15.0
 
+
+def min_attacker_type(board, color, square):
+    attackers = board.attackers_mask(color, square)
+    if attackers:
+        for piece_type, mask in enumerate((board.pawns, board.knights, board.bishops,
+                                           board.rooks, board.queens, board.kings), 1):
+            if attackers & mask:
+                return piece_type
+    return 0
+
+
+def board_masks(board):
+    return (board.occupied, board.occupied_co[chess.WHITE],
+            board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings)
+
+
+def queen_rays(square, occupied):
+    return (chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied] |
+            chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied] |
+            chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied])
+
+
+def square_attacks(masks, square):
+    # attacks of the piece standing on square, given the board_masks of its position
+    bb_square = chess.BB_SQUARES[square]
+    occupied = masks[0]
+    if not occupied & bb_square:
+        return 0
+    if masks[2] & bb_square:
+        return chess.BB_PAWN_ATTACKS[bool(masks[1] & bb_square)][square]
+    elif masks[3] & bb_square:
+        return chess.BB_KNIGHT_ATTACKS[square]
+    elif masks[7] & bb_square:
+        return chess.BB_KING_ATTACKS[square]
+    attacks = 0
+    if masks[4] & bb_square or masks[6] & bb_square:
+        attacks |= chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied]
+    if masks[5] & bb_square or masks[6] & bb_square:
+        attacks |= (chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied] |
+                    chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied])
+    return attacks
+
+
+see_piece_values = (0, 1, 3, 3, 5, 9, 100)
+
+
+def attackers_to(masks, square, occupied):
+    # attackers of both colours on square, with occupied in place of the board occupancy so that pieces
+    # removed during an exchange uncover the sliders behind them
+    _, white, pawns, knights, bishops, rooks, queens, kings = masks
+    bishops_queens = bishops | queens
+    rooks_queens = rooks | queens
+    return ((chess.BB_PAWN_ATTACKS[chess.BLACK][square] & pawns & white) |
+            (chess.BB_PAWN_ATTACKS[chess.WHITE][square] & pawns & ~white) |
+            (chess.BB_KNIGHT_ATTACKS[square] & knights) |
+            (chess.BB_KING_ATTACKS[square] & kings) |
+            (chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied] & bishops_queens) |
+            (chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied] & rooks_queens) |
+            (chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied] & rooks_queens)) & occupied
+
+
+def static_exchange_evaluation(board, move):
+    # Material won in pawns by the exchange that move starts on its target square, with both sides recapturing
+    # with their least valuable attacker and free to stop at any point.
+    masks = board_masks(board)
+    white = masks[1]
+    to_square = move.to_square
+    occupied = masks[0] ^ chess.BB_SQUARES[move.from_square]
+    if board.is_en_passant(move):
+        captured = chess.PAWN
+        occupied ^= chess.BB_SQUARES[board.ep_square ^ 8]
+    else:
+        captured = board.piece_type_at(to_square) or 0
+    attacker = board.piece_type_at(move.from_square)
+    gains = [see_piece_values[captured]]
+    if move.promotion is not None:
+        gains[0] += see_piece_values[move.promotion] - see_piece_values[chess.PAWN]
+        attacker = move.promotion
+
+    color = not board.turn
+    attackers = attackers_to(masks, to_square, occupied)
+    while True:
+        side_attackers = attackers & (white if color else ~white)
+        if not side_attackers:
+            break
+        for piece_type, mask in enumerate(masks[2:], 1):
+            if side_attackers & mask:
+                square = chess.lsb(side_attackers & mask)
+                break
+        if piece_type == chess.KING and attackers & ~side_attackers:
+            # the king cannot recapture into a defended square
+            break
+        gains.append(see_piece_values[attacker] - gains[-1])
+        occupied ^= chess.BB_SQUARES[square]
+        attackers = attackers_to(masks, to_square, occupied)
+        attacker = piece_type
+        color = not color
+
+    for i in range(len(gains) - 1, 0, -1):
+        gains[i - 1] = -max(-gains[i - 1], gains[i])
+    return gains[0]
+
+
+def is_losing_capture(board, move):
+    # taking a piece at least as valuable as the capturing one cannot lose material, so SEE is only needed
+    # for the remaining captures (including en passant, whose target square is empty)
+    victim = see_piece_values[board.piece_type_at(move.to_square) or 0]
+    if victim >= see_piece_values[board.piece_type_at(move.from_square)]:
+        return False
+    return static_exchange_evaluation(board, move) < 0
+
+
+piece_values = np.array([piece_type_to_value[piece_type] for piece_type in range(7)]) / 15.0
+
+BB_NOT_A = np.uint64(~chess.BB_FILE_A & chess.BB_ALL)
+BB_NOT_AB = np.uint64(~(chess.BB_FILE_A | chess.BB_FILE_B) & chess.BB_ALL)
+BB_NOT_H = np.uint64(~chess.BB_FILE_H & chess.BB_ALL)
+BB_NOT_GH = np.uint64(~(chess.BB_FILE_G | chess.BB_FILE_H) & chess.BB_ALL)
+
+# (shift, mask of squares that may be reached without wrapping around the board) for the 8 ray directions
+ORTHOGONAL_DIRECTIONS = [(8, None), (-8, None), (1, BB_NOT_A), (-1, BB_NOT_H)]
+DIAGONAL_DIRECTIONS = [(9, BB_NOT_A), (7, BB_NOT_H), (-7, BB_NOT_A), (-9, BB_NOT_H)]
+KNIGHT_DIRECTIONS = [(17, BB_NOT_A), (15, BB_NOT_H), (10, BB_NOT_AB), (6, BB_NOT_GH),
+                     (-6, BB_NOT_AB), (-10, BB_NOT_GH), (-15, BB_NOT_A), (-17, BB_NOT_H)]
+
+
+def shift(bb, amount, mask=None):
+    if amount > 0:
+        bb = bb << np.uint64(amount)
+    else:
+        bb = bb >> np.uint64(-amount)
+    if mask is not None:
+        bb = bb & mask
+    return bb
+
+
+def slide(bb, empty, directions):
+    # Kogge-Stone occluded fills: union of the attacks of all sliders in bb along the given directions
+    attacks = np.zeros_like(bb)
+    for amount, mask in directions:
+        generator = bb
+        propagator = empty if mask is None else empty & mask
+        generator = generator | (propagator & shift(generator, amount))
+        propagator = propagator & shift(propagator, amount)
+        generator = generator | (propagator & shift(generator, 2 * amount))
+        propagator = propagator & shift(propagator, 2 * amount)
+        generator = generator | (propagator & shift(generator, 4 * amount))
+        attacks |= shift(generator, amount, mask)
+    return attacks
+
+
+def min_attacker_types(masks):
+    # masks: (N, 8) uint64 array of white, black, pawn, knight, bishop, rook, queen and king bitboards.
+    # Returns an (N, 2, 64) array with the lowest piece type of each color (indexed by chess.WHITE/BLACK)
+    # attacking every square, 0 if there is none.
+    empty = ~(masks[:, 0] | masks[:, 1])
+    bits = np.arange(64, dtype=np.uint64)
+    types = np.zeros((masks.shape[0], 2, 64), dtype=np.int64)
+    for color in chess.COLORS:
+        own = masks[:, 0] if color == chess.WHITE else masks[:, 1]
+        pawns, knights, bishops, rooks, queens, kings = [own & masks[:, 2 + idx] for idx in range(6)]
+        if color == chess.WHITE:
+            pawn_attacks = shift(pawns, 9, BB_NOT_A) | shift(pawns, 7, BB_NOT_H)
+        else:
+            pawn_attacks = shift(pawns, -7, BB_NOT_A) | shift(pawns, -9, BB_NOT_H)
+        knight_attacks = np.zeros_like(knights)
+        for amount, mask in KNIGHT_DIRECTIONS:
+            knight_attacks |= shift(knights, amount, mask)
+        king_attacks = np.zeros_like(kings)
+        for amount, mask in ORTHOGONAL_DIRECTIONS + DIAGONAL_DIRECTIONS:
+            king_attacks |= shift(kings, amount, mask)
+        attacks = [pawn_attacks,
+                   knight_attacks,
+                   slide(bishops, empty, DIAGONAL_DIRECTIONS),
+                   slide(rooks, empty, ORTHOGONAL_DIRECTIONS),
+                   slide(queens, empty, DIAGONAL_DIRECTIONS) | slide(queens, empty, ORTHOGONAL_DIRECTIONS),
+                   king_attacks]
+        for piece_type in range(6, 0, -1):
+            attacked = ((attacks[piece_type - 1][:, None] >> bits) & np.uint64(1)).astype(bool)
+            types[:, int(color)][attacked] = piece_type
+    return types
+
+
+def legal_move_counts(board):
+    # number of legal moves from each square. Out of check, an unpinned knight, bishop, rook or queen can move to
+    # every attacked square that is not occupied by its own side, so only pawn, king and pinned piece moves are
+    # generated.
+    if board.is_check():
+        return Counter(move.from_square for move in board.legal_moves)
+    turn = board.turn
+    own = board.occupied_co[turn]
+    king = board.king(turn)
+    counts = Counter(move.from_square for move in board.generate_legal_moves(from_mask=(board.pawns | board.kings) & own))
+    for square in chess.scan_forward((board.knights | board.bishops | board.rooks | board.queens) & own):
+        if king is not None and chess.BB_RAYS[king][square] and board.is_pinned(turn, square):
+            counts[square] = sum(1 for _ in board.generate_legal_moves(from_mask=chess.BB_SQUARES[square]))
+        else:
+            counts[square] = chess.popcount(board.attacks_mask(square) & ~own)
+    return counts
+
+
+class FeatureAccumulator:
+    # Keeps the lowest attacker type of both colors for every occupied square of a board that is searched with
+    # push/pop. A move only changes the attackers of squares attacked by the pieces it moves, captures or
+    # promotes, and of squares on the lines through the squares it vacates or fills, so only those are recomputed.
+    # push only records the masks of the position before the move; feature_vector brings the current position
+    # up to date. The resulting feature vector is identical to ChessEnv.make_feature_vector2.
+    def __init__(self, board):
+        self.board = board
+        self.stack = [[self.full_state(), None]]
+
+    def push(self, move):
+        masks = board_masks(self.board)
+        self.board.push(move)
+        self.stack.append([None, masks])
+
+    def pop(self):
+        self.stack.pop()
+        return self.board.pop()
+
+    def full_state(self):
+        board = self.board
+        types = [0] * 128
+        for square in chess.scan_forward(board.occupied):
+            types[square] = min_attacker_type(board, chess.BLACK, square)
+            types[64 + square] = min_attacker_type(board, chess.WHITE, square)
+        return types
+
+    def materialize(self):
+        entry = self.stack[-1]
+        if entry[0] is not None:
+            return entry[0]
+        board = self.board
+        if self.stack[-2][0] is None:
+            move = board.pop()
+            self.stack.pop()
+            self.materialize()
+            board.push(move)
+            self.stack.append(entry)
+        types = list(self.stack[-2][0])
+
+        pre_masks = entry[1]
+        post_masks = board_masks(board)
+        changed = 0
+        for pre_mask, post_mask in zip(pre_masks[1:], post_masks[1:]):
+            changed |= pre_mask ^ post_mask
+
+        dirty = changed
+        for square in chess.scan_forward(changed):
+            dirty |= (square_attacks(pre_masks, square) | square_attacks(post_masks, square) |
+                      queen_rays(square, pre_masks[0]) | queen_rays(square, post_masks[0]))
+
+        for square in chess.scan_forward(dirty & post_masks[0]):
+            types[square] = min_attacker_type(board, chess.BLACK, square)
+            types[64 + square] = min_attacker_type(board, chess.WHITE, square)
+
+        entry[0] = types
+        return types
+
+    def feature_vector(self):
+        types = self.materialize()
+
+        def attacker_value(board, square, side):
+            if side:
+                return piece_type_to_value[types[64 + square]] / 15.0
+            else:
+                return -piece_type_to_value[types[square]] / 15.0
+
+        return ChessEnv.make_feature_vector2(self.board, attacker_value, legal_move_counts(self.board))
@@ -1,5 +1,5 @@
 from abc import ABCMeta, abstractmethod
-from agents.random_agent import RandomAgent
+import random
 
 
 class GameEnvBase(metaclass=ABCMeta):
@@ -56,7 +56,17 @@ class GameEnvBase(metaclass=ABCMeta):
 
     @staticmethod
     @abstractmethod
-    def is_quiet(board, depth):
+    def is_check(board):
+        return NotImplemented
+
+    @staticmethod
+    @abstractmethod
+    def get_noisy_moves(board):
+        return NotImplemented
+
+    @staticmethod
+    @abstractmethod
+    def material_gain(board, move):
         return NotImplemented
 
     @abstractmethod
@@ -67,18 +77,38 @@ class GameEnvBase(metaclass=ABCMeta):
     def zobrist_hash(self, board):
         return NotImplemented
 
+    @staticmethod
+    @abstractmethod
+    def encode_move(move):
+        return NotImplemented
+
+    @staticmethod
+    @abstractmethod
+    def decode_move(code):
+        return NotImplemented
+
     @abstractmethod
-    def sort_children(self, parent, children, ttable, killers):
+    def sort_moves(self, board, moves, hash_move=None, killers=(), countermove=None, history=None):
         return NotImplemented
 
+    @classmethod
+    def make_feature_vector2(cls, board):
+        # the feature vector the search evaluates; environments with a single feature set use make_feature_vector
+        return cls.make_feature_vector(board)
+
+    @staticmethod
+    def make_feature_accumulator(board):
+        # environments without incremental feature updates recompute the feature vector at every leaf
+        return None
+
     def play_random(self, get_move_function, side):
 
         self.reset()
-        random_agent = RandomAgent('random_agent_0', None, self)
+        random_move_function = lambda env: random.choice(env.get_legal_moves())
         if side:
-            move_functions = [random_agent.get_move, get_move_function]  # True == 1 == 'X'
+            move_functions = [random_move_function, get_move_function]  # True == 1 == 'X'
         else:
-            move_functions = [get_move_function, random_agent.get_move]
+            move_functions = [get_move_function, random_move_function]
 
         while self.get_reward() is None:
             move_function = move_functions[int(self.board.turn)]
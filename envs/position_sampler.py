@@ -0,0 +1,73 @@
+import os
+import random
+import time
+from functools import partial
+from multiprocessing import get_context
+from queue import Empty
+import numpy as np
+from envs.chess import ChessEnv
+
+
+def produce(make_env, queue, episode_count):
+    # forked producers would otherwise all draw the same positions
+    seed = int.from_bytes(os.urandom(4), 'little')
+    random.seed(seed)
+    np.random.seed(seed)
+
+    env = make_env()
+    while True:
+        count = episode_count.value
+        env.random_position(None if count < 0 else count)
+        queue.put(env.board)
+
+
+class PositionSampler:
+    # Background processes that sample training positions into a bounded queue. Forked worker processes share
+    # the queue, so one sampler can feed every ChessEnv created in the parent. Must be created before any
+    # TensorFlow server or session threads are started.
+    def __init__(self, make_env=partial(ChessEnv, position_sampler=None), prefetch=256, num_producers=1):
+        context = get_context('fork')
+        self.prefetch = prefetch
+        self.queue = context.Queue(maxsize=prefetch)
+        self.episode_count = context.Value('q', -1)
+        self.num_samples = context.Value('q', 0)
+        self.num_starved = context.Value('q', 0)
+        self.starved_time = context.Value('d', 0.0)
+
+        self.producers = []
+        for _ in range(num_producers):
+            producer = context.Process(target=produce, args=(make_env, self.queue, self.episode_count), daemon=True)
+            producer.start()
+            self.producers.append(producer)
+
+    def sample(self, episode_count=None):
+        if episode_count is not None:
+            self.episode_count.value = episode_count
+
+        try:
+            board = self.queue.get_nowait()
+        except Empty:
+            t0 = time.time()
+            board = self.queue.get()
+            with self.num_starved.get_lock():
+                self.num_starved.value += 1
+            with self.starved_time.get_lock():
+                self.starved_time.value += time.time() - t0
+
+        with self.num_samples.get_lock():
+            self.num_samples.value += 1
+        return board
+
+    def stats(self):
+        num_samples = self.num_samples.value
+        num_starved = self.num_starved.value
+        return {'samples': num_samples,
+                'starved': num_starved,
+                'starved_rate': num_starved / num_samples if num_samples else 0.0,
+                'starved_time': self.starved_time.value,
+                'queue_size': self.queue.qsize()}
+
+    def close(self):
+        for producer in self.producers:
+            producer.terminate()
+            producer.join()
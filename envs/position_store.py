@@ -0,0 +1,100 @@
+import numpy as np
+import chess
+from chess.pgn import read_game
+from os import makedirs
+from os.path import join
+
+# A position is packed into 36 bytes: 32 bytes of square nibbles (piece type, +8 for black), then turn and
+# castling flags, en passant square + 1 and the halfmove clock. The fullmove number follows from the ply.
+RECORD_BYTES = 36
+CASTLING_SQUARES = [chess.A1, chess.H1, chess.A8, chess.H8]
+
+
+def pack_board(board):
+    squares = np.zeros(64, dtype=np.uint8)
+    for color in chess.COLORS:
+        for piece_type in chess.PIECE_TYPES:
+            code = piece_type if color else piece_type | 8
+            for square in chess.scan_forward(board.pieces_mask(piece_type, color)):
+                squares[square] = code
+
+    record = np.zeros(RECORD_BYTES, dtype=np.uint8)
+    record[:32] = squares[0::2] | (squares[1::2] << 4)
+
+    flags = int(board.turn)
+    for bit, square in enumerate(CASTLING_SQUARES, 1):
+        if board.castling_rights & chess.BB_SQUARES[square]:
+            flags |= 1 << bit
+    record[32] = flags
+    record[33] = board.ep_square + 1 if board.ep_square is not None and board.has_legal_en_passant() else 0
+    record[34] = min(board.halfmove_clock, 255)
+    return record
+
+
+def unpack_board(record, ply=0):
+    squares = np.empty(64, dtype=np.uint8)
+    squares[0::2] = record[:32] & 15
+    squares[1::2] = record[:32] >> 4
+
+    board = chess.Board(None)
+    board.set_piece_map({int(square): chess.Piece(int(code) & 7, not code & 8)
+                         for square, code in zip(np.flatnonzero(squares), squares[squares > 0])})
+
+    flags = int(record[32])
+    board.turn = bool(flags & 1)
+    board.castling_rights = 0
+    for bit, square in enumerate(CASTLING_SQUARES, 1):
+        if flags & (1 << bit):
+            board.castling_rights |= chess.BB_SQUARES[square]
+    board.ep_square = int(record[33]) - 1 if record[33] else None
+    board.halfmove_clock = int(record[34])
+    board.fullmove_number = ply // 2 + 1
+    return board
+
+
+def build(pgn, path, max_games=None):
+    # Every position before a main line move of every game in pgn is written to path/boards.bin, and
+    # path/game_offsets.npy holds the index of the first position of each game plus the total count.
+    makedirs(path, exist_ok=True)
+    offsets = [0]
+    with open(join(path, 'boards.bin'), 'wb') as f:
+        while max_games is None or len(offsets) <= max_games:
+            game = read_game(pgn)
+            if game is None:
+                break
+            board = game.board()
+            records = []
+            for move in game.mainline_moves():
+                records.append(pack_board(board))
+                board.push(move)
+            if len(records) < 2:
+                continue
+            f.write(np.vstack(records).tobytes())
+            offsets.append(offsets[-1] + len(records))
+    np.save(join(path, 'game_offsets.npy'), np.array(offsets, dtype=np.int64))
+    return len(offsets) - 1, offsets[-1]
+
+
+class PositionStore:
+    def __init__(self, path):
+        self.game_offsets = np.load(join(path, 'game_offsets.npy'), mmap_mode='r')
+        self.boards = np.memmap(join(path, 'boards.bin'), dtype=np.uint8, mode='r').reshape(-1, RECORD_BYTES)
+        self.num_games = len(self.game_offsets) - 1
+
+    def __len__(self):
+        return len(self.boards)
+
+    def get_board(self, game_idx, ply):
+        return unpack_board(self.boards[self.game_offsets[game_idx] + ply], ply)
+
+    def sample(self, episode_count=None, decay=5000, random_state=np.random):
+        # Same distribution over plies as ChessEnv.random_board_generator: the earliest ply starts near the end of
+        # the game and decays towards the first move as episode_count grows. The last move is never taken.
+        game_idx = random_state.randint(self.num_games)
+        num_moves = int(self.game_offsets[game_idx + 1] - self.game_offsets[game_idx])
+        if episode_count is None:
+            min_ply = 0
+        else:
+            min_ply = min(int(np.e ** (-episode_count / decay) * (num_moves - 1)), num_moves - 2)
+        ply = random_state.randint(min_ply, num_moves - 1)
+        return self.get_board(game_idx, ply)
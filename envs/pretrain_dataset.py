@@ -0,0 +1,61 @@
+import numpy as np
+import chess
+from glob import glob
+from multiprocessing import Pool
+from os import makedirs
+from os.path import join
+from .chess import ChessEnv
+from .position_store import PositionStore, unpack_board
+
+material_values = [(chess.PAWN, 1), (chess.KNIGHT, 3), (chess.BISHOP, 3), (chess.ROOK, 5), (chess.QUEEN, 9)]
+
+
+def material_value(board):
+    # same value as material_value_from_fen, counted from the piece bitboards
+    value = 0
+    for piece_type, piece_value in material_values:
+        value += piece_value * (chess.popcount(board.pieces_mask(piece_type, chess.WHITE)) -
+                                chess.popcount(board.pieces_mask(piece_type, chess.BLACK)))
+    return value
+
+
+def make_shard(args):
+    store_path, indices, features_path, targets_path = args
+    store = PositionStore(store_path)
+    boards = [unpack_board(store.boards[idx]) for idx in indices]
+    features = ChessEnv.make_feature_matrix(boards)
+    targets = np.tanh(np.array([[material_value(board)] for board in boards], dtype=np.float32) / 5.0)
+    np.save(features_path, features)
+    np.save(targets_path, targets)
+    return len(indices)
+
+
+def build(store_path, path, num_positions=None, shard_size=2 ** 18, processes=None, seed=0):
+    # Writes features_NNNNN.npy (float32, N x 171) and targets_NNNNN.npy (float32, N x 1, tanh(material / 5))
+    # shards for num_positions positions drawn without replacement from the position store.
+    makedirs(path, exist_ok=True)
+    num_stored = len(PositionStore(store_path))
+    if num_positions is None or num_positions >= num_stored:
+        indices = np.arange(num_stored)
+    else:
+        indices = np.sort(np.random.RandomState(seed).choice(num_stored, num_positions, replace=False))
+
+    tasks = []
+    for shard_idx, start in enumerate(range(0, len(indices), shard_size)):
+        tasks.append((store_path, indices[start:start + shard_size],
+                      join(path, 'features_%05d.npy' % shard_idx),
+                      join(path, 'targets_%05d.npy' % shard_idx)))
+    with Pool(processes) as pool:
+        return sum(pool.imap_unordered(make_shard, tasks))
+
+
+def iterate_minibatches(path, batch_size=4096, random_state=np.random):
+    # One pass over every shard in random order, each shuffled in memory-mapped form.
+    features_paths = sorted(glob(join(path, 'features_*.npy')))
+    for shard_idx in random_state.permutation(len(features_paths)):
+        features = np.load(features_paths[shard_idx], mmap_mode='r')
+        targets = np.load(features_paths[shard_idx].replace('features_', 'targets_'), mmap_mode='r')
+        order = random_state.permutation(len(features))
+        for start in range(0, len(order), batch_size):
+            batch = np.sort(order[start:start + batch_size])
+            yield features[batch], targets[batch]
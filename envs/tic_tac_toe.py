@@ -49,10 +49,25 @@ class TicTacToeEnv(GameEnvBase):
         return board.legal_moves
 
     def zobrist_hash(self, board):
-        return board.fen()
+        cells = board.xs.reshape(9) + 2 * board.os.reshape(9)
+        return int(np.dot(cells, 3 ** np.arange(9))) * 2 + int(board.turn)
 
-    def sort_children(self, parent, children, ttable, killers):
-        return children
+    @staticmethod
+    def encode_move(move):
+        if move is None:
+            return 0
+        return int(move) + 1
+
+    @staticmethod
+    def decode_move(code):
+        if code == 0:
+            return None
+        return code - 1
+
+    def sort_moves(self, board, moves, hash_move=None, killers=(), countermove=None, history=None):
+        if hash_move is not None and hash_move in moves:
+            moves = [hash_move] + [move for move in moves if move != hash_move]
+        return moves
 
     @classmethod
     def make_feature_vector(cls, board):
@@ -111,8 +126,16 @@ class TicTacToeEnv(GameEnvBase):
         return 28
 
     @staticmethod
-    def is_quiet(board, depth):
-        return True
+    def is_check(board):
+        return False
+
+    @staticmethod
+    def get_noisy_moves(board):
+        return []
+
+    @staticmethod
+    def material_gain(board, move):
+        return 0
 
 
 class TicTacToeBoard(BoardBase):
@@ -181,6 +204,8 @@ class TicTacToeBoard(BoardBase):
 
         self.xs[row, col] = 0
         self.os[row, col] = 0
+        self._turn = not self._turn
+        self._legal_moves = np.where((self.xs + self.os).reshape(9) == 0)[0]
 
         return move
 
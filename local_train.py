@@ -0,0 +1,252 @@
+from agents.search import AlphaBetaSearch
+from agents.shared_parameters import SharedParameters, NumpyAdam
+from agents.replay_buffer import ReplayBuffer
+from agents.trajectory_buffer import TrajectoryBuffer
+from agents.td_leaf_agent import TDLeafAgent, play_episode, episode_leaf_weights, lambda_returns
+from envs.chess import ChessEnv
+from envs.position_sampler import PositionSampler
+from functools import partial
+from multiprocessing import get_context, cpu_count
+from os import makedirs, urandom
+from os.path import join
+import numpy as np
+import random
+import tensorflow as tf
+import time
+from value_model import ValueModel, NumpyValueFunction
+import argparse
+
+
+def search_move(search, value_function, env, depth, pre_train):
+    leaf_value, pv, leaf_board = search.search(env.board, depth, value_function, pre_train)
+    move = pv[0] if len(pv) > 0 else env.get_null_move()
+    return move, leaf_value, leaf_board
+
+
+def train_worker(params, task_index, position_sampler, num_moves, depth, verbose):
+    seed = int.from_bytes(urandom(4), 'little')
+    random.seed(seed)
+    np.random.seed(seed)
+
+    env = ChessEnv(position_sampler=position_sampler)
+    search = AlphaBetaSearch(env)
+    worker_name = 'worker_%03d' % task_index
+
+    while True:
+        version, weights = params.pull()
+        value_function = NumpyValueFunction(*weights)
+        search.eval_cache.set_version(version)
+
+        episode_number = params.increment_train_episode_count()
+        env.random_position(episode_count=episode_number)
+        search.reset()
+        feature_matrix, values, _ = play_episode(env, search, partial(search_move, search, value_function),
+                                                 num_moves, depth)
+        leaf_weights, _ = episode_leaf_weights(values)
+        params.push(value_function.weighted_gradients(feature_matrix, leaf_weights))
+
+        if verbose:
+            print(worker_name,
+                  "EPISODE:", episode_number,
+                  "UPDATE:", version,
+                  "REWARD:", env.get_reward())
+            print('-' * 100)
+
+
+def act_worker(params, trajectory_buffer, task_index, position_sampler, num_moves, depth, refresh_episodes, verbose):
+    # only searches; the trajectories are learned from in the chief and the weights are pulled every
+    # refresh_episodes episodes
+    seed = int.from_bytes(urandom(4), 'little')
+    random.seed(seed)
+    np.random.seed(seed)
+
+    env = ChessEnv(position_sampler=position_sampler)
+    search = AlphaBetaSearch(env)
+    worker_name = 'actor_%03d' % task_index
+
+    episode_idx = 0
+    while True:
+        if episode_idx % refresh_episodes == 0:
+            version, weights = params.pull()
+            value_function = NumpyValueFunction(*weights)
+            search.eval_cache.set_version(version)
+
+        episode_number = params.increment_train_episode_count()
+        env.random_position(episode_count=episode_number)
+        search.reset()
+        feature_matrix, values, _ = play_episode(env, search, partial(search_move, search, value_function),
+                                                 num_moves, depth)
+        trajectory_buffer.put(feature_matrix, values, env.get_reward(), version)
+        episode_idx += 1
+
+        if verbose:
+            print(worker_name,
+                  "EPISODE:", episode_number,
+                  "UPDATE:", version,
+                  "REWARD:", env.get_reward())
+            print('-' * 100)
+
+
+def learn(weights, trajectories):
+    # mean gradient of the TD-Leaf(lambda) updates of the trajectories, from one pass over all of their leaves
+    feature_matrix = np.vstack([features for features, _, _, _ in trajectories])
+    leaf_weights = np.concatenate([episode_leaf_weights(values)[0] for _, values, _, _ in trajectories])
+    grads = NumpyValueFunction(*weights).weighted_gradients(feature_matrix, leaf_weights)
+    return [-grad / len(trajectories) for grad in grads]
+
+
+def replay_grads(weights, replay_buffer, batch_size):
+    # gradient of the importance weighted squared error between the values and the lambda-return targets of a
+    # minibatch of stored leaves; the priorities are updated with the new deltas
+    indices, feature_matrix, targets, sample_weights = replay_buffer.sample(batch_size)
+    value_function = NumpyValueFunction(*weights)
+    deltas = targets[:, 0] - value_function(feature_matrix)[:, 0]
+    replay_buffer.update_priorities(indices, deltas)
+    grads = value_function.weighted_gradients(feature_matrix, sample_weights * deltas)
+    return [-grad / batch_size for grad in grads]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("run_name")
+    parser.add_argument("--trainers", type=int, default=cpu_count() - 1)
+    parser.add_argument("--actor_learner", action='store_true',
+                        help="trainers only search and the chief computes the gradients of their trajectories")
+    parser.add_argument("--refresh_episodes", type=int, default=5,
+                        help="episodes an actor plays between pulls of the weights")
+    parser.add_argument("--buffer_capacity", type=int, default=256, help="trajectories held for the learner")
+    parser.add_argument("--replay_capacity", type=int, default=0,
+                        help="leaves kept for replay by the learner, 0 disables replay")
+    parser.add_argument("--replay_eviction", choices=['fifo', 'random', 'priority'], default='fifo')
+    parser.add_argument("--prioritized_replay", action='store_true', help="sample leaves by their last |delta|")
+    parser.add_argument("--replay_updates", type=int, default=4, help="replay minibatch updates per update")
+    parser.add_argument("--replay_batch_size", type=int, default=256)
+    parser.add_argument("--episodes_per_apply", type=int, default=10, help="episodes per gradient update")
+    parser.add_argument("--max_staleness", type=float, default=None,
+                        help="seconds after which fewer than episodes_per_apply episodes are applied")
+    parser.add_argument("--save_secs", type=float, default=600, help="seconds between checkpoints")
+    parser.add_argument("--sampler_processes", type=int, default=2,
+                        help="background processes sampling training positions, 0 samples in each trainer")
+    parser.add_argument("--prefetch", type=int, default=256, help="positions sampled ahead of time")
+    args = parser.parse_args()
+    if args.replay_capacity > 0 and not args.actor_learner:
+        parser.error("--replay_capacity needs --actor_learner")
+
+    log_dir = "./log/" + args.run_name
+    makedirs(log_dir, exist_ok=True)
+
+    # every process is forked before any TensorFlow threads are started; the trainers wait for the chief to
+    # publish the weights
+    if args.sampler_processes > 0:
+        position_sampler = PositionSampler(prefetch=args.prefetch, num_producers=args.sampler_processes)
+    else:
+        position_sampler = None
+    num_moves = 10
+    depth = 3
+    params = SharedParameters(ValueModel.get_weight_shapes())
+    if args.actor_learner:
+        trajectory_buffer = TrajectoryBuffer(args.buffer_capacity, num_moves, ChessEnv.get_feature_vector_size())
+    else:
+        trajectory_buffer = None
+    if args.replay_capacity > 0:
+        replay_buffer = ReplayBuffer(args.replay_capacity, ChessEnv.get_feature_vector_size(),
+                                     eviction=args.replay_eviction, prioritized=args.prioritized_replay)
+    else:
+        replay_buffer = None
+    context = get_context('fork')
+    processes = []
+    for task_idx in range(args.trainers):
+        if args.actor_learner:
+            p = context.Process(target=act_worker, args=(params, trajectory_buffer, task_idx + 1, position_sampler,
+                                                         num_moves, depth, args.refresh_episodes, True),
+                                daemon=True)
+        else:
+            p = context.Process(target=train_worker, args=(params, task_idx + 1, position_sampler, num_moves, depth,
+                                                           True),
+                                daemon=True)
+        processes.append(p)
+        p.start()
+
+    # the chief keeps the full agent graph to read and write checkpoints in the layout of the distributed runs
+    with tf.variable_scope('local'):
+        local_network = ValueModel(is_local=True)
+    network = ValueModel()
+    agent = TDLeafAgent('worker_000', network, local_network, ChessEnv(load_pgn=False))
+    slots = [agent.opt.get_slot(tvar, name) for name in ['m', 'v'] for tvar in network.trainable_variables]
+    beta1_power, beta2_power = agent.opt._get_beta_accumulators()
+    saver = tf.train.Saver()
+
+    adam = NumpyAdam(ValueModel.get_weight_shapes())
+    with tf.Session() as sess:
+        sess.run([tf.global_variables_initializer(), tf.local_variables_initializer()])
+        checkpoint = tf.train.latest_checkpoint(log_dir)
+        if checkpoint is not None:
+            saver.restore(sess, checkpoint)
+            print("RESTORED:", checkpoint)
+
+        weights, update_count, train_episode_count = sess.run([network.weights, agent.update_count,
+                                                               agent.train_episode_count])
+        slot_values, adam.beta1_power, adam.beta2_power = sess.run([slots, beta1_power, beta2_power])
+        adam.m, adam.v = slot_values[:3], slot_values[3:]
+        params.train_episode_count.value = train_episode_count
+        params.set_weights(weights, update_count)
+
+        def save():
+            for tvar, weight in zip(network.weights, weights):
+                tvar.load(weight, sess)
+            for slot, slot_value in zip(slots, adam.m + adam.v):
+                slot.load(slot_value, sess)
+            beta1_power.load(adam.beta1_power, sess)
+            beta2_power.load(adam.beta2_power, sess)
+            agent.update_count.load(update_count, sess)
+            agent.train_episode_count.load(params.train_episode_count.value, sess)
+            saver.save(sess, join(log_dir, 'model.ckpt'), global_step=update_count)
+
+        last_save = time.time()
+        try:
+            while True:
+                if args.actor_learner:
+                    trajectories = trajectory_buffer.get(args.episodes_per_apply, args.max_staleness)
+                    if not trajectories:
+                        continue
+                    num_episodes = len(trajectories)
+                    grads = learn(weights, trajectories)
+                else:
+                    num_episodes, grads = params.wait_for_grads(args.episodes_per_apply, args.max_staleness)
+                adam.apply_gradients(weights, grads)
+                params.update_weights(weights)
+                update_count += 1
+                print('worker_000',
+                      "UPDATE:", update_count,
+                      "APPLIED GRADS OF", num_episodes, "EPISODES")
+                if args.actor_learner:
+                    print("STALENESS:", update_count - 1 - np.mean([version for _, _, _, version in trajectories]),
+                          "BUFFER:", trajectory_buffer.stats())
+
+                if replay_buffer is not None:
+                    for feature_matrix, values, _, _ in trajectories:
+                        targets = lambda_returns(values)
+                        replay_buffer.add(feature_matrix, targets, targets - values)
+                    for _ in range(args.replay_updates):
+                        adam.apply_gradients(weights, replay_grads(weights, replay_buffer, args.replay_batch_size))
+                        params.update_weights(weights)
+                        update_count += 1
+                    print("REPLAY LEAVES:", len(replay_buffer), "UPDATE:", update_count)
+                print('-' * 100)
+
+                if time.time() - last_save > args.save_secs:
+                    save()
+                    last_save = time.time()
+        finally:
+            save()
+            for p in processes:
+                p.terminate()
+            if position_sampler is not None:
+                position_sampler.close()
+            if trajectory_buffer is not None:
+                trajectory_buffer.close()
+            params.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+from agents.td_leaf_agent import TDLeafAgent
+from envs.chess import ChessEnv
+from envs.pretrain_dataset import iterate_minibatches
+import tensorflow as tf
+from value_model import ValueModel
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("run_name")
+    parser.add_argument("--data", default="./data/pretrain/", help="shards written by build_pretrain_dataset.py")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--batch_size", type=int, default=4096)
+    parser.add_argument("--learning_rate", type=float, default=0.001)
+    args = parser.parse_args()
+
+    # the full agent graph is built so that the checkpoint can be picked up by the distributed training scripts
+    with tf.variable_scope('local'):
+        local_network = ValueModel(is_local=True)
+    network = ValueModel()
+    agent = TDLeafAgent('pretrainer', network, local_network, ChessEnv(load_pgn=False))
+
+    target_ = tf.placeholder(tf.float32, shape=[None, 1], name='target_')
+    loss = tf.reduce_mean(tf.square(network.value - target_))
+    train_op = tf.train.AdamOptimizer(args.learning_rate, name='pretrain').minimize(
+        loss, global_step=agent.update_count, var_list=network.trainable_variables)
+    tf.summary.scalar("pretrain_loss", loss)
+
+    summary_op = tf.summary.merge_all()
+    scaffold = tf.train.Scaffold(summary_op=summary_op)
+
+    with tf.train.MonitoredTrainingSession(checkpoint_dir="./log/" + args.run_name,
+                                           save_summaries_steps=100,
+                                           scaffold=scaffold) as sess:
+        agent.sess = sess
+        for epoch in range(args.epochs):
+            for batch_idx, (features, targets) in enumerate(iterate_minibatches(args.data, args.batch_size)):
+                _, batch_loss = sess.run([train_op, loss], feed_dict={network.feature_vector_: features,
+                                                                      target_: targets})
+                if batch_idx % 100 == 0:
+                    print("EPOCH:", epoch, "BATCH:", batch_idx, "LOSS:", batch_loss)
+
+
+if __name__ == "__main__":
+    main()
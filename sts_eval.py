@@ -0,0 +1,79 @@
+from agents.search import AlphaBetaSearch
+from envs.chess import ChessEnv, parse_test_string, read_test_strings
+import chess
+from multiprocessing import Pool, cpu_count
+import numpy as np
+import tensorflow as tf
+from value_model import NumpyValueFunction
+import argparse
+import re
+import time
+
+_worker = dict()
+
+
+def load_weights(checkpoint, scope='model/global'):
+    reader = tf.train.NewCheckpointReader(checkpoint)
+    return [reader.get_tensor('%s/layer_%d/W_%d' % (scope, i, i)) for i in range(1, 4)]
+
+
+def elo_estimate(test_results):
+    # same estimate as AgentBase.elo_estimate: a linear fit on the first ten suites
+    return np.sum(test_results[:1000]) * 0.359226 + 10.402545
+
+
+def init_worker(weights, depth, time_limit):
+    _worker['value_function'] = NumpyValueFunction(*weights)
+    _worker['search'] = AlphaBetaSearch(ChessEnv(load_pgn=False))
+    _worker['depth'] = depth
+    _worker['time_limit'] = time_limit
+
+
+def work(task):
+    result_idx, string = task
+    d = parse_test_string(string)
+    search = _worker['search']
+    search.reset()
+    board = chess.Board(d['fen'])
+    _, pv, _ = search.search(board, _worker['depth'], _worker['value_function'], time_limit=_worker['time_limit'])
+    result = d['c0'].get(board.san(pv[0]), 0) if pv else 0
+    return result_idx, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("run_name")
+    parser.add_argument("--checkpoint", default=None, help="defaults to the latest checkpoint of the run")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--time_limit", type=float, default=None, help="seconds per test position")
+    parser.add_argument("--processes", type=int, default=cpu_count())
+    args = parser.parse_args()
+
+    checkpoint = args.checkpoint or tf.train.latest_checkpoint("./log/" + args.run_name)
+    weights = load_weights(checkpoint)
+
+    test_filenames, test_strings = read_test_strings("./chess_tests/")
+    tasks = []
+    for filename, string in zip(test_filenames, test_strings):
+        matches = re.split('-|\.', filename)
+        row_idx = int(matches[0])
+        test_idx = int(matches[1][-2:]) - 1
+        tasks.append((test_idx * 100 + row_idx, string))
+
+    test_results = np.zeros(1400, dtype=np.int32)
+    t0 = time.time()
+    with Pool(args.processes, initializer=init_worker, initargs=(weights, args.depth, args.time_limit)) as pool:
+        for result_idx, result in pool.imap_unordered(work, tasks):
+            test_results[result_idx] = result
+    elapsed = time.time() - t0
+
+    print("CHECKPOINT:", checkpoint)
+    for test_idx, total in enumerate(test_results.reshape(14, 100).sum(axis=1)):
+        print("STS%02d:" % (test_idx + 1), total)
+    print("TOTAL:", np.sum(test_results))
+    print("ELO ESTIMATE:", elo_estimate(test_results))
+    print("POSITIONS/SEC: %.2f" % (len(tasks) / elapsed))
+
+
+if __name__ == "__main__":
+    main()
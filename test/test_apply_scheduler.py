@@ -0,0 +1,62 @@
+import unittest
+import time
+from agents.apply_scheduler import ApplyScheduler
+
+try:
+    import tensorflow as tf
+except ImportError:
+    tf = None
+
+
+class StubAgent:
+    # the part of TDLeafAgent the scheduler uses; applying records the episode count it was fed
+    def __init__(self):
+        self.episodes_since_apply_grad = tf.Variable(0, trainable=False, dtype=tf.int32)
+        self.reset_episodes_since_apply_grad = tf.assign(self.episodes_since_apply_grad, 0)
+        self.num_grads_ = tf.placeholder(tf.int32)
+        self.num_grads = tf.Variable(0, trainable=False, dtype=tf.int32)
+        self.apply_and_reset_grads = tf.assign(self.num_grads, self.num_grads_)
+
+
+@unittest.skipUnless(tf is not None and hasattr(tf, 'Session'), 'needs TensorFlow 1.x')
+class TestApplyScheduler(unittest.TestCase):
+    def test_full_batch(self):
+        with tf.Graph().as_default():
+            agent = StubAgent()
+            scheduler = ApplyScheduler(agent, episodes_per_apply=3)
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                for _ in range(4):
+                    scheduler.episode_done(sess)
+                self.assertEqual(scheduler.wait_and_apply(sess), 3)
+                self.assertEqual(sess.run(agent.num_grads), 3)
+
+                stats = scheduler.stats()
+                self.assertEqual(stats['applies'], 1)
+                self.assertEqual(stats['stale_applies'], 0)
+                self.assertEqual(stats['episodes_per_apply'], 3.0)
+                self.assertEqual(stats['queue_depth'], 1)
+
+    def test_max_staleness(self):
+        with tf.Graph().as_default():
+            agent = StubAgent()
+            scheduler = ApplyScheduler(agent, episodes_per_apply=5, max_staleness=0.2)
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                for _ in range(2):
+                    scheduler.episode_done(sess)
+                t0 = time.time()
+                self.assertEqual(scheduler.wait_and_apply(sess), 2)
+                self.assertGreaterEqual(time.time() - t0, 0.1)
+                self.assertEqual(sess.run(agent.num_grads), 2)
+
+                stats = scheduler.stats()
+                self.assertEqual(stats['applies'], 1)
+                self.assertEqual(stats['stale_applies'], 1)
+                self.assertEqual(stats['queue_depth'], 0)
+
+                # tokens that arrive after a stale apply go into the next one
+                for _ in range(5):
+                    scheduler.episode_done(sess)
+                self.assertEqual(scheduler.wait_and_apply(sess), 5)
+                self.assertEqual(scheduler.stats()['stale_applies'], 1)
@@ -0,0 +1,35 @@
+import unittest
+import numpy as np
+from agents.eval_cache import EvalCache
+
+
+class TestEvalCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = EvalCache(capacity=2)
+        cache.put(1, np.array([[0.1]]))
+        cache.put(2, np.array([[0.2]]))
+        self.assertAlmostEqual(cache.get(1)[0, 0], 0.1)
+        cache.put(3, np.array([[0.3]]))
+        self.assertIsNone(cache.get(2))
+        self.assertIsNotNone(cache.get(1))
+        self.assertIsNotNone(cache.get(3))
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_version(self):
+        cache = EvalCache()
+        cache.set_version(0)
+        cache.put(1, np.array([[0.1]]))
+        cache.set_version(0)
+        self.assertIsNotNone(cache.peek(1))
+        cache.set_version(1)
+        self.assertIsNone(cache.peek(1))
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+
+    def test_feature_vectors(self):
+        fv = np.ones((1, 3))
+        cache = EvalCache(store_features=True)
+        cache.put(1, np.array([[0.1]]), fv)
+        self.assertTrue(np.array_equal(cache.feature_vector(1), fv))
+        cache = EvalCache()
+        cache.put(1, np.array([[0.1]]), fv)
+        self.assertIsNone(cache.feature_vector(1))
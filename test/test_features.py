@@ -0,0 +1,63 @@
+import unittest
+import random
+import chess
+import numpy as np
+from envs.chess import ChessEnv, FeatureAccumulator, parse_test_string, read_test_strings
+
+
+class TestFeatureAccumulator(unittest.TestCase):
+    def setUp(self):
+        _, test_strings = read_test_strings("./chess_tests/")
+        self.fens = [parse_test_string(string)['fen'] for string in test_strings[::28]]
+        self.random = random.Random(0)
+
+    def assert_identical(self, accumulator):
+        expected = ChessEnv.make_feature_vector2(accumulator.board)
+        self.assertTrue(np.array_equal(accumulator.feature_vector(), expected), accumulator.board.fen())
+
+    def test_random_walks(self):
+        for fen in self.fens + [chess.STARTING_FEN]:
+            board = chess.Board(fen)
+            accumulator = FeatureAccumulator(board)
+            self.assert_identical(accumulator)
+            for _ in range(30):
+                moves = list(board.legal_moves)
+                if moves and (len(board.move_stack) == 0 or self.random.random() < 0.7):
+                    accumulator.push(self.random.choice(moves))
+                else:
+                    accumulator.pop()
+                if self.random.random() < 0.5:
+                    self.assert_identical(accumulator)
+            self.assertEqual(len(accumulator.stack), len(board.move_stack) + 1)
+
+    def test_special_moves(self):
+        fens_moves = [('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1', ['e1g1', 'e8c8']),
+                      ('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1', ['e5d6']),
+                      ('1n2k3/P7/8/8/8/8/8/4K3 w - - 0 1', ['a7b8q', 'e8d7']),
+                      ('4k3/4r3/8/8/1b6/8/3NB3/4K3 b - - 0 1', ['e8d8', 'e1f1', 'e7e2'])]
+        for fen, moves in fens_moves:
+            board = chess.Board(fen)
+            accumulator = FeatureAccumulator(board)
+            self.assert_identical(accumulator)
+            for move in moves:
+                accumulator.push(chess.Move.from_uci(move))
+                self.assert_identical(accumulator)
+
+
+class TestFeatureMatrix(unittest.TestCase):
+    def test_matches_feature_vector(self):
+        _, test_strings = read_test_strings("./chess_tests/")
+        rng = random.Random(1)
+        boards = []
+        for string in test_strings[::14]:
+            board = chess.Board(parse_test_string(string)['fen'])
+            for _ in range(rng.randint(0, 6)):
+                moves = list(board.legal_moves)
+                if moves:
+                    board.push(rng.choice(moves))
+            boards.append(board)
+
+        feature_matrix = ChessEnv.make_feature_matrix(boards)
+        expected = np.vstack([ChessEnv.make_feature_vector2(board) for board in boards]).astype(np.float32)
+        self.assertEqual(feature_matrix.dtype, np.float32)
+        self.assertTrue(np.array_equal(feature_matrix, expected))
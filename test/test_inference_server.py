@@ -0,0 +1,75 @@
+import unittest
+import socket
+import struct
+from multiprocessing import get_context
+import numpy as np
+from agents.inference_server import InferenceServer
+from value_model import ValueModel, NumpyValueFunction
+
+
+def evaluate(inference_server, seed, results):
+    client = inference_server.client()
+    rng = np.random.RandomState(seed)
+    for num_rows in [1, 5, 1, 40]:
+        fv = rng.uniform(size=(num_rows, 171))
+        results.put((seed, fv, client(fv)))
+    client.close()
+
+
+class TestInferenceServer(unittest.TestCase):
+    def test_matches_value_function(self):
+        rng = np.random.RandomState(0)
+        weight_shapes = ValueModel.get_weight_shapes(hidden_dim=16)
+        value_function = NumpyValueFunction(*[rng.normal(scale=0.3, size=shape) for shape in weight_shapes])
+
+        inference_server = InferenceServer(weight_shapes, 171, max_batch_size=32, max_wait_us=1000)
+        try:
+            inference_server.set_weights(3, value_function)
+            # older weights are ignored
+            inference_server.set_weights(2, NumpyValueFunction(*[np.zeros(shape) for shape in weight_shapes]))
+            self.assertEqual(inference_server.version(), 3)
+
+            context = get_context('fork')
+            results = context.Queue()
+            clients = [context.Process(target=evaluate, args=(inference_server, seed, results)) for seed in range(3)]
+            for client in clients:
+                client.start()
+            for _ in range(12):
+                _, fv, values = results.get(timeout=10)
+                self.assertEqual(values.shape, (len(fv), 1))
+                self.assertTrue(np.allclose(values, value_function(fv), atol=1e-6))
+            for client in clients:
+                client.join()
+
+            stats = inference_server.stats()
+            self.assertEqual(stats['requests'], 12)
+            self.assertEqual(sum(stats['batch_histogram'].values()),
+                             stats['batches'])
+            self.assertLessEqual(stats['batches'], 12)
+            self.assertGreaterEqual(stats['max_queue_us'], stats['mean_queue_us'])
+        finally:
+            inference_server.close()
+
+    def test_client_gone(self):
+        rng = np.random.RandomState(0)
+        weight_shapes = ValueModel.get_weight_shapes(hidden_dim=16)
+        value_function = NumpyValueFunction(*[rng.normal(scale=0.3, size=shape) for shape in weight_shapes])
+        fv = rng.uniform(size=(1, 171)).astype(np.float32)
+
+        inference_server = InferenceServer(weight_shapes, 171, max_wait_us=1000)
+        try:
+            inference_server.set_weights(0, value_function)
+            # one client closes after the header, another one before its answer is sent
+            for message in [struct.pack('<I', 4), struct.pack('<I', 1) + fv.tobytes()]:
+                conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                conn.connect(inference_server.socket_path)
+                conn.sendall(message)
+                conn.close()
+
+            client = inference_server.client()
+            for _ in range(3):
+                self.assertTrue(np.allclose(client(fv), value_function(fv), atol=1e-6))
+            client.close()
+            self.assertTrue(inference_server.process.is_alive())
+        finally:
+            inference_server.close()
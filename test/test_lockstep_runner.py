@@ -0,0 +1,79 @@
+import threading
+import unittest
+import numpy as np
+from agents.lockstep_runner import BatchingValueFunction, LockstepRunner
+from envs.tic_tac_toe import TicTacToeEnv
+
+
+class TestBatchingValueFunction(unittest.TestCase):
+    def test_one_call_per_round(self):
+        batch_sizes = []
+
+        def value_function(fv):
+            batch_sizes.append(len(fv))
+            return fv.sum(axis=1, keepdims=True)
+
+        batching_value_function = BatchingValueFunction(value_function)
+        results = dict()
+
+        def work(game_idx, num_rounds):
+            try:
+                for round_idx in range(num_rounds):
+                    fv = np.full((game_idx + 1, 2), round_idx)
+                    results[game_idx, round_idx] = batching_value_function(fv)
+            finally:
+                batching_value_function.remove_game()
+
+        # the game with a single round finishes early, the others keep batching without it
+        threads = []
+        for game_idx, num_rounds in enumerate([3, 1, 3]):
+            batching_value_function.add_game()
+            threads.append(threading.Thread(target=work, args=(game_idx, num_rounds)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(batch_sizes, [6, 4, 4])
+        for (game_idx, round_idx), values in results.items():
+            self.assertTrue(np.array_equal(values, np.full((game_idx + 1, 1), 2 * round_idx)))
+
+
+class TestLockstepRunner(unittest.TestCase):
+    def test_random_agent_test(self):
+        fv_size = TicTacToeEnv.get_feature_vector_size()
+        weights = np.zeros((fv_size, 1))
+        weights[:9, 0] = 0.1
+        weights[9:18, 0] = -0.1
+
+        runner = LockstepRunner([TicTacToeEnv() for _ in range(4)])
+        result = runner.random_agent_test(lambda fv: np.tanh(np.dot(fv, weights)), depth=2, num_games=10)
+        self.assertEqual(sum(result[:3]), 10)
+        self.assertEqual(sum(result[3:]), 10)
+        self.assertEqual(runner.stats['games'], 20)
+        self.assertGreater(runner.stats['rows_per_call'], 1)
+
+    def test_value_function_error(self):
+        num_calls = [0]
+
+        def value_function(fv):
+            num_calls[0] += 1
+            if num_calls[0] == 3:
+                raise ValueError('bad batch')
+            return np.zeros((len(fv), 1))
+
+        # every game waiting on the failed batch gets the error, so run returns instead of hanging in join
+        runner = LockstepRunner([TicTacToeEnv() for _ in range(4)])
+        errors = []
+
+        def run():
+            try:
+                runner.random_agent_test(value_function, depth=2, num_games=10)
+            except ValueError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual([str(e) for e in errors], ['bad batch'])
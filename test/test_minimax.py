@@ -1,94 +1,108 @@
 import unittest
-from anytree import Node, RenderTree
-from anytree.render import AsciiStyle
-from agents.td_leaf_agent import TDLeafAgent
+import chess
+import numpy as np
+from agents.search import AlphaBetaSearch, convert_string_result
 from envs.chess import ChessEnv
-from value_model import ValueModel
 
 
-class TestMinimax(unittest.TestCase):
-    def test_render(self):
-
-        class TestChessEnv(ChessEnv):
-            @staticmethod
-            def is_quiet(board, depth):
-                return True
-
-        env = TestChessEnv(load_tests=False, load_pgn=False)
-
-        env2 = TestChessEnv(load_tests=False, load_pgn=False)
-        env2.make_move(list(env2.get_legal_moves(env2.board))[0])
-
-        env3 = TestChessEnv(load_tests=False, load_pgn=False)
-        env3.make_move(list(env3.get_legal_moves(env3.board))[0])
-        env3.make_move(list(env3.get_legal_moves(env3.board))[0])
-
-        env4 = TestChessEnv(load_tests=False, load_pgn=False)
-        env4.make_move(list(env4.get_legal_moves(env4.board))[0])
-        env4.make_move(list(env4.get_legal_moves(env4.board))[0])
-        env4.make_move(list(env4.get_legal_moves(env4.board))[0])
-
-        model = ValueModel()
-        agent = TDLeafAgent('agent', model, env)
-
-        a = Node('a', board=env.board, value=6)
-
-        b1 = Node('b1', parent=a, board=env2.board, value=3)
-        b2 = Node('b2', parent=a, board=env2.board, value=6)
-        b3 = Node('b3', parent=a, board=env2.board, value=5)
-
-        c11 = Node('c11', parent=b1, board=env3.board, value=5)
-        c12 = Node('c12', parent=b1, board=env3.board, value=3)
-
-        c21 = Node('c21', parent=b2, board=env3.board, value=6)
-        c22 = Node('c22', parent=b2, board=env3.board, value=7)
-
-        c31 = Node('c31', parent=b3, board=env3.board, value=5)
-        c32 = Node('c32', parent=b3, board=env3.board, value=8)
+def make_value_function(seed=0):
+    weights = np.random.RandomState(seed).normal(scale=0.1, size=(ChessEnv.get_feature_vector_size(), 1))
 
-        d111 = Node('d111', parent=c11, board=env4.board, value=5)
-        d112 = Node('d112', parent=c11, board=env4.board, value=4)
+    def f(fv):
+        return np.tanh(np.dot(fv, weights))
+    return f
 
-        d121 = Node('d121', parent=c12, board=env4.board, value=3)
 
-        d211 = Node('d211', parent=c21, board=env4.board, value=6)
-        d212 = Node('d212', parent=c21, board=env4.board, value=6)
+def reference_quiescence(env, board, qdepth, max_qdepth, value_function):
+    if board.is_game_over():
+        return convert_string_result(board.result())
 
-        d221 = Node('d221', parent=c22, board=env4.board, value=7)
+    values = []
+    if not board.is_check() or qdepth >= max_qdepth:
+        values.append(value_function(env.make_feature_vector2(board)))
+        if qdepth >= max_qdepth:
+            return values[0]
+    for move in env.get_noisy_moves(board):
+        child_board = board.copy()
+        child_board.push(move)
+        values.append(reference_quiescence(env, child_board, qdepth + 1, max_qdepth, value_function))
+    if board.turn:
+        return max(values)
+    else:
+        return min(values)
 
-        d311 = Node('d311', parent=c31, board=env4.board, value=5)
 
-        d321 = Node('d321', parent=c32, board=env4.board, value=8)
-        d322 = Node('d322', parent=c32, board=env4.board, value=6)
+def reference_minimax(env, board, depth, value_function, max_qdepth=6):
+    if board.is_game_over():
+        return convert_string_result(board.result())
+    elif depth <= 0:
+        return reference_quiescence(env, board, 0, max_qdepth, value_function)
 
-        e1111 = Node('e1111', parent=d111, board=env4.board, value=5)
-        e1112 = Node('e1112', parent=d111, board=env4.board, value=6)
+    values = []
+    for move in board.legal_moves:
+        child_board = board.copy()
+        child_board.push(move)
+        values.append(reference_minimax(env, child_board, depth - 1, value_function, max_qdepth))
+    if board.turn:
+        return max(values)
+    else:
+        return min(values)
 
-        e1121 = Node('e1121', parent=d112, board=env4.board, value=7)
-        e1122 = Node('e1122', parent=d112, board=env4.board, value=4)
-        e1123 = Node('e1123', parent=d112, board=env4.board, value=5)
 
-        e1211 = Node('e1211', parent=d121, board=env4.board, value=3)
-
-        e2111 = Node('e2111', parent=d211, board=env4.board, value=6)
-
-        e2121 = Node('e2121', parent=d212, board=env4.board, value=6)
-        e2122 = Node('e2122', parent=d212, board=env4.board, value=9)
-
-        e2211 = Node('e2211', parent=d221, board=env4.board, value=7)
-
-        e3111 = Node('e3111', parent=d311, board=env4.board, value=5)
-
-        e3211 = Node('e3211', parent=d321, board=env4.board, value=9)
-        e3212 = Node('e3212', parent=d321, board=env4.board, value=8)
-
-        e3221 = Node('e3221', parent=d322, board=env4.board, value=6)
-
-        # print(RenderTree(a, style=AsciiStyle()))
-
-        print('\n')
-        v, n = agent.minimax(a, 4, -100000, 100000, lambda node: node.value, False)
-
-        print('\n\n', v, n)
-
-        assert(True)
+class TestMinimax(unittest.TestCase):
+    def setUp(self):
+        self.env = ChessEnv(load_pgn=False)
+        self.value_function = make_value_function()
+        self.fens = [chess.STARTING_FEN,
+                     'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3',
+                     'r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4']
+
+    def test_matches_reference(self):
+        for fen in self.fens:
+            board = chess.Board(fen)
+            search = AlphaBetaSearch(self.env, delta_margin=None, max_qdepth=3)
+            value, pv, leaf_board = search.search(board, 2, self.value_function)
+            expected = reference_minimax(self.env, board, 2, self.value_function, max_qdepth=3)
+            self.assertAlmostEqual(value[0, 0], expected[0, 0])
+
+    def test_batched_matches_unbatched(self):
+        for fen in self.fens:
+            board = chess.Board(fen)
+            results = []
+            for leaf_batch_size in [1, 7, 256]:
+                search = AlphaBetaSearch(self.env, leaf_batch_size=leaf_batch_size)
+                value, pv, leaf_board = search.search(board, 3, self.value_function)
+                results.append((value[0, 0], pv))
+            for result in results[1:]:
+                self.assertAlmostEqual(result[0], results[0][0])
+                self.assertEqual(result[1], results[0][1])
+
+    def test_leaf_board(self):
+        board = chess.Board()
+        search = AlphaBetaSearch(self.env)
+        value, pv, leaf_board = search.search(board, 2, self.value_function)
+        self.assertEqual(board.fen(), chess.STARTING_FEN)
+        self.assertEqual(len(pv), 2)
+        self.assertEqual(leaf_board.move_stack[-len(pv):], pv)
+        leaf_value = self.value_function(self.env.make_feature_vector2(leaf_board))
+        self.assertAlmostEqual(value[0, 0], leaf_value[0, 0])
+
+    def test_node_limit(self):
+        board = chess.Board(self.fens[1])
+        search = AlphaBetaSearch(self.env)
+        value, pv, leaf_board = search.search(board, 4, self.value_function, node_limit=50)
+        self.assertGreaterEqual(search.completed_depth, 1)
+        self.assertLess(search.completed_depth, 4)
+        self.assertIn(pv[0], board.legal_moves)
+
+    def test_eval_cache(self):
+        board = chess.Board(self.fens[1])
+        search = AlphaBetaSearch(self.env)
+        first = search.search(board, 2, self.value_function)
+        misses = search.eval_cache.misses
+        search.reset()
+        second = search.search(board, 2, self.value_function)
+        self.assertAlmostEqual(first[0][0, 0], second[0][0, 0])
+        self.assertEqual(first[1], second[1])
+        self.assertEqual(search.eval_cache.misses, misses)
+        self.assertGreater(search.eval_cache.hits, 0)
@@ -0,0 +1,27 @@
+import unittest
+import chess
+import numpy as np
+from agents.parallel_search import ParallelSearch
+from agents.search import AlphaBetaSearch
+from envs.chess import ChessEnv
+from value_model import ValueModel, NumpyValueFunction
+
+
+class TestParallelSearch(unittest.TestCase):
+    def test_matches_serial_search(self):
+        rng = np.random.RandomState(0)
+        weight_shapes = ValueModel.get_weight_shapes(hidden_dim=16)
+        value_function = NumpyValueFunction(*[rng.normal(scale=0.3, size=shape) for shape in weight_shapes])
+
+        parallel_search = ParallelSearch(2, weight_shapes)
+        try:
+            parallel_search.set_weights(0, value_function)
+            for fen in [chess.STARTING_FEN, 'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3']:
+                board = chess.Board(fen)
+                value, pv, leaf_board = parallel_search.search(board, 2)
+                expected, _, _ = AlphaBetaSearch(ChessEnv(load_pgn=False)).search(board, 2, value_function)
+                self.assertAlmostEqual(value[0, 0], expected[0, 0], places=5)
+                self.assertEqual(leaf_board.move_stack[-len(pv):], pv)
+                self.assertEqual(board.fen(), fen)
+        finally:
+            parallel_search.close()
@@ -0,0 +1,43 @@
+import unittest
+import chess
+from envs.chess import ChessEnv
+from envs.position_sampler import PositionSampler
+
+
+class CountingEnv:
+    # stands in for ChessEnv: every position records the episode count it was sampled for
+    def __init__(self):
+        self.board = chess.Board()
+
+    def random_position(self, episode_count=None):
+        self.board = chess.Board()
+        self.board.halfmove_clock = 0 if episode_count is None else episode_count
+
+
+class TestPositionSampler(unittest.TestCase):
+    def test_sample(self):
+        prefetch, num_producers = 4, 2
+        sampler = PositionSampler(make_env=CountingEnv, prefetch=prefetch, num_producers=num_producers)
+        try:
+            env = ChessEnv(position_sampler=sampler)
+            counts = []
+            for _ in range(20):
+                env.random_position(7)
+                counts.append(env.board.halfmove_clock)
+            self.assertEqual(env.board.board_fen(), chess.Board().board_fen())
+
+            stats = sampler.stats()
+            self.assertEqual(stats['samples'], 20)
+            self.assertLessEqual(stats['starved'], 20)
+            self.assertLessEqual(stats['queue_size'], prefetch)
+
+            # only the positions already queued and one per producer can predate the latest episode count, though
+            # a descheduled producer can put its stale position after newer ones
+            self.assertLessEqual(set(counts), {0, 7})
+            self.assertLessEqual(counts.count(0), prefetch + num_producers)
+
+            counts = [sampler.sample(9).halfmove_clock for _ in range(20)]
+            self.assertLessEqual(set(counts), {0, 7, 9})
+            self.assertLessEqual(len(counts) - counts.count(9), prefetch + num_producers)
+        finally:
+            sampler.close()
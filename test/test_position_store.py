@@ -0,0 +1,61 @@
+import unittest
+import io
+import random
+import shutil
+import tempfile
+import chess
+import chess.pgn
+import chess.polyglot
+import numpy as np
+from envs.position_store import PositionStore, build, pack_board, unpack_board
+from envs.chess import parse_test_string, read_test_strings
+
+PGN = """[Event "a"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 4. Ba4 Nf6 5. O-O Be7 6. Re1 b5 7. Bb3 d6 8. c3 O-O 1-0
+
+[Event "b"]
+[Result "0-1"]
+
+1. d4 d5 2. c4 e6 3. Nc3 Nf6 4. cxd5 exd5 5. Bg5 c6 6. e3 Bf5 7. Qf3 Bg6 8. Bxf6 Qxf6 9. Qxf6 gxf6 0-1
+"""
+
+
+class TestPositionStore(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_pack_unpack(self):
+        _, test_strings = read_test_strings("./chess_tests/")
+        rng = random.Random(0)
+        for string in test_strings[::50]:
+            board = chess.Board(parse_test_string(string)['fen'])
+            for _ in range(rng.randint(0, 10)):
+                moves = list(board.legal_moves)
+                if moves:
+                    board.push(rng.choice(moves))
+            unpacked = unpack_board(pack_board(board))
+            self.assertEqual(unpacked.board_fen(), board.board_fen())
+            self.assertEqual(unpacked.turn, board.turn)
+            self.assertEqual(unpacked.castling_rights, board.castling_rights)
+            self.assertEqual(chess.polyglot.zobrist_hash(unpacked), chess.polyglot.zobrist_hash(board))
+
+    def test_build_and_sample(self):
+        self.assertEqual(build(io.StringIO(PGN), self.path), (2, 34))
+        store = PositionStore(self.path)
+
+        game = chess.pgn.read_game(io.StringIO(PGN))
+        board = game.board()
+        for ply, move in enumerate(game.mainline_moves()):
+            self.assertEqual(store.get_board(0, ply).fen(), board.fen())
+            board.push(move)
+
+        random_state = np.random.RandomState(0)
+        for _ in range(20):
+            # at episode 0 only the second to last position of a game can be sampled
+            self.assertIn(store.sample(0, random_state=random_state).fullmove_number, [8, 9])
+            self.assertIsNotNone(store.sample(None, random_state=random_state))
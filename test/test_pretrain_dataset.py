@@ -0,0 +1,55 @@
+import unittest
+import io
+import shutil
+import tempfile
+from os.path import join
+import chess
+import numpy as np
+from envs.chess import ChessEnv, material_value_from_board, parse_test_string, read_test_strings
+from envs import position_store
+from envs.position_store import PositionStore, unpack_board
+from envs.pretrain_dataset import build, iterate_minibatches, material_value
+from test.test_position_store import PGN
+
+
+class TestPretrainDataset(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_material_value(self):
+        _, test_strings = read_test_strings("./chess_tests/")
+        for string in test_strings[::20]:
+            board = chess.Board(parse_test_string(string)['fen'])
+            self.assertEqual(material_value(board), material_value_from_board(board)[0, 0])
+
+    def test_build_and_iterate(self):
+        store_path = join(self.path, 'positions')
+        dataset_path = join(self.path, 'pretrain')
+        position_store.build(io.StringIO(PGN), store_path)
+        boards = [unpack_board(record) for record in PositionStore(store_path).boards]
+        self.assertEqual(build(store_path, dataset_path, shard_size=10, processes=2), len(boards))
+
+        features = []
+        targets = []
+        for features_batch, targets_batch in iterate_minibatches(dataset_path, batch_size=4,
+                                                                 random_state=np.random.RandomState(0)):
+            self.assertLessEqual(len(features_batch), 4)
+            self.assertEqual(features_batch.dtype, np.float32)
+            self.assertEqual(targets_batch.dtype, np.float32)
+            self.assertEqual(features_batch.shape, (len(features_batch), ChessEnv.get_feature_vector_size()))
+            self.assertEqual(targets_batch.shape, (len(features_batch), 1))
+            features.append(features_batch)
+            targets.append(targets_batch)
+
+        # every position exactly once, with its target; the start position appears once per game
+        rows = np.hstack([np.vstack(features), np.vstack(targets)])
+        expected = np.hstack([ChessEnv.make_feature_matrix(boards),
+                              np.tanh(np.array([[material_value(board)] for board in boards]) / 5.0)])
+        self.assertEqual(len(rows), len(boards))
+        self.assertTrue(np.allclose(rows[np.lexsort(rows.T)], expected[np.lexsort(expected.T)]))
+
+        self.assertEqual(build(store_path, join(self.path, 'subset'), num_positions=20, shard_size=8), 20)
+        self.assertEqual(sum(len(batch) for batch, _ in iterate_minibatches(join(self.path, 'subset'))), 20)
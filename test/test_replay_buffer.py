@@ -0,0 +1,55 @@
+import unittest
+import numpy as np
+from agents.replay_buffer import ReplayBuffer
+
+
+def leaves(start, num_leaves):
+    feature_matrix = np.arange(start, start + num_leaves)[:, None] * np.ones((1, 3))
+    return feature_matrix, np.arange(start, start + num_leaves) / 10.0
+
+
+class TestReplayBuffer(unittest.TestCase):
+    def test_fifo(self):
+        replay_buffer = ReplayBuffer(5, 3)
+        for start, num_leaves in [(0, 3), (3, 4), (7, 2)]:
+            replay_buffer.add(*leaves(start, num_leaves))
+        self.assertEqual(len(replay_buffer), 5)
+        self.assertEqual(sorted(replay_buffer.features[:, 0]), [4, 5, 6, 7, 8])
+        self.assertTrue(np.allclose(replay_buffer.targets[:, 0], replay_buffer.features[:, 0] / 10.0))
+
+        # more leaves than the capacity keeps the last ones
+        replay_buffer.add(*leaves(10, 7))
+        self.assertEqual(sorted(replay_buffer.features[:, 0]), [12, 13, 14, 15, 16])
+        self.assertEqual(replay_buffer.features.dtype, np.float32)
+
+    def test_eviction(self):
+        replay_buffer = ReplayBuffer(4, 3, eviction='priority')
+        replay_buffer.add(*leaves(0, 4), priorities=np.array([0.5, -0.1, 0.3, 0.2]))
+        replay_buffer.add(*leaves(4, 2), priorities=np.array([1.0, 1.0]))
+        self.assertEqual(sorted(replay_buffer.features[:, 0]), [0, 2, 4, 5])
+
+        replay_buffer = ReplayBuffer(6, 3, eviction='random', random_state=np.random.RandomState(0))
+        for start in range(0, 20, 4):
+            replay_buffer.add(*leaves(start, 4))
+            self.assertEqual(len(set(replay_buffer.features[:len(replay_buffer), 0])), len(replay_buffer))
+
+    def test_prioritized_sample(self):
+        replay_buffer = ReplayBuffer(4, 3, prioritized=True, alpha=1.0, random_state=np.random.RandomState(0))
+        replay_buffer.add(*leaves(0, 3), priorities=np.array([0.0, 1.0, 3.0]))
+        indices, feature_matrix, targets, weights = replay_buffer.sample(4000)
+        self.assertTrue(np.array_equal(feature_matrix[:, 0], indices))
+        self.assertEqual(targets.shape, (4000, 1))
+        counts = np.bincount(indices, minlength=3)
+        # a delta of 0 still leaves a small chance of being sampled
+        self.assertGreater(counts[0], 0)
+        self.assertLess(counts[0], 40)
+        self.assertAlmostEqual(counts[2] / counts[1], 3.0, delta=0.4)
+        self.assertEqual(weights.max(), 1.0)
+        self.assertTrue(np.all(weights[indices == 2] < weights[indices == 1][0]))
+
+        replay_buffer.update_priorities(np.array([0, 2]), np.array([-2.0, 0.0]))
+        self.assertTrue(np.allclose(replay_buffer.priorities[:3], [2.01, 1.01, 0.01]))
+        indices, _, _, _ = replay_buffer.sample(4000)
+        counts = np.bincount(indices, minlength=3)
+        self.assertGreater(counts[2], 0)
+        self.assertLess(counts[2], 40)
@@ -0,0 +1,23 @@
+import unittest
+import chess
+from envs.chess import ChessEnv, static_exchange_evaluation
+
+
+class TestStaticExchangeEvaluation(unittest.TestCase):
+    def test_exchanges(self):
+        fens_moves_values = [('1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1', 'e1e5', 1),
+                             ('1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1', 'd3e5', -2),
+                             ('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1', 'e5d6', 1),
+                             ('4k3/8/2p5/3p4/4P3/8/8/4K3 w - - 0 1', 'e4d5', 0),
+                             ('4k3/3r4/3r4/3p4/8/8/3R4/3RK3 w - - 0 1', 'd2d5', -4),
+                             ('3qk3/3r4/8/3p4/8/3Q4/3R4/3RK3 w - - 0 1', 'd3d5', -3),
+                             ('4k3/8/4n3/3r4/4K3/8/8/8 w - - 0 1', 'e4d5', 5),
+                             ('3rk3/P7/8/8/8/8/8/4K3 w - - 0 1', 'a7a8q', -1)]
+        for fen, move, value in fens_moves_values:
+            self.assertEqual(static_exchange_evaluation(chess.Board(fen), chess.Move.from_uci(move)), value, fen)
+
+    def test_losing_captures_last(self):
+        board = chess.Board('4k3/3r4/3r4/3p4/8/8/3R4/3RK3 w - - 0 1')
+        moves = ChessEnv(load_pgn=False).sort_moves(board, list(board.legal_moves))
+        self.assertEqual(moves[-1], chess.Move.from_uci('d2d5'))
+        self.assertNotIn(chess.Move.from_uci('d2d5'), ChessEnv.get_noisy_moves(board))
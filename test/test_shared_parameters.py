@@ -0,0 +1,53 @@
+import unittest
+from multiprocessing import get_context
+import numpy as np
+from agents.shared_parameters import SharedParameters, NumpyAdam
+
+
+def push_ones(params, num_episodes):
+    for _ in range(num_episodes):
+        params.push([np.ones(shape, dtype=np.float32) for shape in params.shapes])
+
+
+class TestSharedParameters(unittest.TestCase):
+    def test_push_and_apply(self):
+        shapes = [(3, 2), (2, 1)]
+        params = SharedParameters(shapes)
+        try:
+            params.set_weights([np.full(shape, 2.0) for shape in shapes], 5)
+            version, weights = params.pull()
+            self.assertEqual(version, 5)
+            self.assertTrue(np.array_equal(weights[0], np.full((3, 2), 2.0)))
+
+            p = get_context('fork').Process(target=push_ones, args=(params, 4))
+            p.start()
+            num_grads, grads = params.wait_for_grads(4)
+            p.join()
+            self.assertEqual(num_grads, 4)
+            self.assertTrue(np.array_equal(grads[1], -np.ones((2, 1))))
+            self.assertTrue(np.array_equal(params.grad_accums[0], np.zeros((3, 2))))
+
+            push_ones(params, 1)
+            num_grads, _ = params.wait_for_grads(4, max_staleness=0.01)
+            self.assertEqual(num_grads, 1)
+
+            params.update_weights([np.zeros(shape) for shape in shapes])
+            version, weights = params.pull()
+            self.assertEqual(version, 6)
+            self.assertTrue(np.array_equal(weights[1], np.zeros((2, 1))))
+        finally:
+            params.close()
+
+
+class TestNumpyAdam(unittest.TestCase):
+    def test_first_steps(self):
+        # the first step moves every variable by about the learning rate against the sign of its gradient
+        adam = NumpyAdam([(4,)], learning_rate=0.01)
+        variable = np.zeros(4, dtype=np.float32)
+        grad = np.array([1.0, -2.0, 0.5, -0.1], dtype=np.float32)
+        adam.apply_gradients([variable], [grad])
+        self.assertTrue(np.allclose(variable, -0.01 * np.sign(grad), rtol=1e-4))
+        self.assertAlmostEqual(adam.beta1_power, 0.9 ** 2)
+
+        adam.apply_gradients([variable], [grad])
+        self.assertTrue(np.allclose(variable, -0.02 * np.sign(grad), rtol=1e-4))
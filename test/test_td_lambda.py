@@ -0,0 +1,30 @@
+import unittest
+import numpy as np
+from agents.td_leaf_agent import td_lambda_weights, lambda_returns
+
+
+class TestTDLambdaWeights(unittest.TestCase):
+    def test_matches_traces(self):
+        rng = np.random.RandomState(0)
+        lamda = 0.7
+        for num_leaves in [1, 2, 10]:
+            values = rng.uniform(-1, 1, size=num_leaves)
+            grads = rng.normal(size=(num_leaves, 5))
+
+            # eligibility trace arithmetic of the per-move update
+            trace = np.zeros(5)
+            grad_accum = np.zeros(5)
+            for t in range(1, num_leaves):
+                trace = lamda * trace + grads[t - 1]
+                grad_accum -= (values[t] - values[t - 1]) * trace
+
+            weights = td_lambda_weights(np.diff(values), lamda)
+            self.assertEqual(weights.shape, (num_leaves,))
+            self.assertTrue(np.allclose(-np.dot(weights, grads), grad_accum))
+
+    def test_lambda_returns(self):
+        values = np.array([0.1, -0.3, 0.4, 0.2])
+        targets = lambda_returns(values, 0.7)
+        self.assertTrue(np.allclose(targets - values, td_lambda_weights(np.diff(values), 0.7)))
+        self.assertEqual(targets[-1], values[-1])
+        self.assertEqual(len(lambda_returns(np.zeros(0))), 0)
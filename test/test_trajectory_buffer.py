@@ -0,0 +1,36 @@
+import unittest
+from multiprocessing import get_context
+import numpy as np
+from agents.trajectory_buffer import TrajectoryBuffer
+
+
+def put_trajectories(trajectory_buffer, num_trajectories):
+    for idx in range(num_trajectories):
+        length = idx % 3 + 1
+        trajectory_buffer.put(np.full((length, 4), idx), np.arange(length) + idx, None if idx % 2 else 1, idx)
+
+
+class TestTrajectoryBuffer(unittest.TestCase):
+    def test_put_and_get(self):
+        trajectory_buffer = TrajectoryBuffer(capacity=3, max_length=3, fv_size=4)
+        try:
+            # more trajectories than the capacity, so the producer has to wait for the consumer
+            p = get_context('fork').Process(target=put_trajectories, args=(trajectory_buffer, 7))
+            p.start()
+            trajectories = []
+            while len(trajectories) < 7:
+                trajectories += trajectory_buffer.get(2, timeout=5)
+            p.join()
+
+            for idx, (features, values, reward, version) in enumerate(trajectories):
+                length = idx % 3 + 1
+                self.assertTrue(np.array_equal(features, np.full((length, 4), idx)))
+                self.assertTrue(np.array_equal(values, np.arange(length) + idx))
+                self.assertEqual(reward, None if idx % 2 else 1)
+                self.assertEqual(version, idx)
+
+            self.assertEqual(len(trajectory_buffer), 0)
+            self.assertEqual(trajectory_buffer.get(1, timeout=0.01), [])
+            self.assertEqual(trajectory_buffer.stats()['trajectories'], 7)
+        finally:
+            trajectory_buffer.close()
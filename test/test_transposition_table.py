@@ -0,0 +1,51 @@
+import unittest
+from agents.transposition_table import TranspositionTable, EXACT, LOWERBOUND, UPPERBOUND
+
+
+class TestTranspositionTable(unittest.TestCase):
+    def setUp(self):
+        self.ttable = TranspositionTable(size_mb=0.01)
+        self.num_buckets = self.ttable.num_buckets
+
+    def test_size(self):
+        self.assertLessEqual(self.ttable.nbytes, 0.01 * 2 ** 20)
+        self.assertEqual(TranspositionTable(size_mb=16).nbytes, TranspositionTable(size_mb=16).nbytes)
+
+    def test_store_probe(self):
+        key = 2 ** 64 - 1
+        self.ttable.store(key, 0.25, EXACT, 3, 1234)
+        self.assertEqual(self.ttable.probe(key), (0.25, EXACT, 3, 1234))
+        self.assertIsNone(self.ttable.probe(key - 1))
+
+        self.ttable.store(key, -0.5, LOWERBOUND, 4)
+        self.assertEqual(self.ttable.probe(key), (-0.5, LOWERBOUND, 4, 1234))
+
+    def test_depth_preferred(self):
+        deep, shallow, other = 1, 1 + self.num_buckets, 1 + 2 * self.num_buckets
+        self.ttable.store(deep, 0.1, EXACT, 5)
+        self.ttable.store(shallow, 0.2, UPPERBOUND, 1)
+        self.ttable.store(other, 0.3, EXACT, 2)
+        self.assertIsNotNone(self.ttable.probe(deep))
+        self.assertIsNone(self.ttable.probe(shallow))
+        self.assertIsNotNone(self.ttable.probe(other))
+
+        self.ttable.store(shallow, 0.2, EXACT, 6)
+        self.assertEqual(self.ttable.probe(shallow)[2], 6)
+        self.assertEqual(self.ttable.probe(deep)[2], 5)
+        self.assertIsNone(self.ttable.probe(other))
+
+    def test_generation_aging(self):
+        old, new = 1, 1 + self.num_buckets
+        self.ttable.store(old, 0.1, EXACT, 5)
+        self.ttable.new_search()
+        self.assertIsNotNone(self.ttable.probe(old))
+
+        self.ttable.store(new, 0.2, EXACT, 1)
+        self.assertEqual(self.ttable.probe(new)[2], 1)
+        self.assertEqual(self.ttable.probe(old)[2], 5)
+        self.assertEqual(self.ttable.generations[old % self.num_buckets, 0], self.ttable.generation)
+
+    def test_clear(self):
+        self.ttable.store(7, 0.1, EXACT, 1)
+        self.ttable.clear()
+        self.assertIsNone(self.ttable.probe(7))
@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+from value_model import ValueModel, NumpyValueFunction
+
+try:
+    import tensorflow as tf
+except ImportError:
+    tf = None
+
+
+class TestNumpyValueFunction(unittest.TestCase):
+    def test_matches_float64_forward_pass(self):
+        rng = np.random.RandomState(0)
+        weights = [rng.normal(scale=0.1, size=shape) for shape in [(171, 1000), (1000, 1000), (1000, 1)]]
+        fvs = rng.uniform(size=(16, 171))
+
+        hidden_1 = np.maximum(np.dot(fvs, weights[0]), 0)
+        hidden_2 = np.maximum(np.dot(hidden_1, weights[1]), 0)
+        expected = np.tanh(np.dot(hidden_2, weights[2]))
+
+        value_function = NumpyValueFunction(*weights)
+        values = value_function(fvs)
+        self.assertEqual(values.shape, (16, 1))
+        self.assertTrue(np.allclose(values, expected, atol=1e-4))
+        self.assertTrue(np.allclose(value_function(fvs[3:4]), values[3:4], atol=1e-6))
+
+    def test_weighted_gradients(self):
+        rng = np.random.RandomState(0)
+        weights = [rng.normal(scale=0.3, size=shape) for shape in [(6, 5), (5, 4), (4, 1)]]
+        fvs = rng.uniform(size=(3, 6))
+        leaf_weights = np.array([0.5, -1.0, 2.0])
+
+        def objective(weights):
+            hidden_1 = np.maximum(np.dot(fvs, weights[0]), 0)
+            hidden_2 = np.maximum(np.dot(hidden_1, weights[1]), 0)
+            return np.dot(leaf_weights, np.tanh(np.dot(hidden_2, weights[2]))[:, 0])
+
+        grads = NumpyValueFunction(*weights).weighted_gradients(fvs, leaf_weights)
+        eps = 1e-6
+        for weight, grad in zip(weights, grads):
+            self.assertEqual(grad.shape, weight.shape)
+            for idx in np.ndindex(*weight.shape):
+                weight[idx] += eps
+                upper = objective(weights)
+                weight[idx] -= 2 * eps
+                lower = objective(weights)
+                weight[idx] += eps
+                self.assertAlmostEqual(grad[idx], (upper - lower) / (2 * eps), places=3)
+
+    @unittest.skipUnless(tf is not None and hasattr(tf, 'Session'), 'needs TensorFlow 1.x')
+    def test_matches_value_model(self):
+        rng = np.random.RandomState(0)
+        with tf.Graph().as_default():
+            tf.set_random_seed(0)
+            model = ValueModel()
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                fvs = rng.uniform(size=(16, ValueModel.get_weight_shapes()[0][0])).astype(np.float32)
+                expected = sess.run(model.value, feed_dict={model.feature_vector_: fvs})
+
+                value_function = NumpyValueFunction(*[sess.run(weight) for weight in model.weights])
+                self.assertTrue(np.allclose(value_function(fvs), expected, atol=1e-5))
+                self.assertTrue(np.allclose(model.numpy_value_function(sess)(fvs), expected, atol=1e-5))
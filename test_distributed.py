@@ -1,36 +1,20 @@
 from agents.td_leaf_agent import TDLeafAgent
-from envs.chess import ChessEnv
+from agents.parallel_search import ParallelSearch
+from envs.chess import ChessEnv, parse_test_string, read_test_strings
 from multiprocessing import Process
 import tensorflow as tf
 from value_model import ValueModel
 import argparse
-from os import listdir
-from os.path import isfile, join
 import re
 
 
-def parse_test_string(string):
-    data = [s for s in string.split('; ')]
-    d = dict()
-    d['fen'] = data[0].split(' bm ')[0] + " 0 0"
-    d['bm'] = data[0].split(' bm ')[1]
+def work(env, task_index, cluster, log_dir, verbose, time_limit=None, search_processes=0):
 
-    for c in data[1:]:
-        c = c.replace('"', '')
-        c = c.replace(';', '')
-        item = c.split(maxsplit=1, sep=" ")
-        d[item[0]] = item[1]
-
-    move_rewards = {}
-    answers = d['c0'].split(',')
-    for answer in answers:
-        move_reward = answer.split('=')
-        move_rewards[move_reward[0].strip()] = int(move_reward[1])
-    d['c0'] = move_rewards
-    return d
-
-
-def work(env, task_index, cluster, log_dir, verbose):
+    # the search pool is forked before the server starts its threads
+    if search_processes > 0:
+        parallel_search = ParallelSearch(search_processes, ValueModel.get_weight_shapes())
+    else:
+        parallel_search = None
 
     server = tf.train.Server(cluster,
                              job_name="tester",
@@ -52,15 +36,10 @@ def work(env, task_index, cluster, log_dir, verbose):
                             network,
                             local_network,
                             env,
-                            verbose=verbose)
+                            verbose=verbose,
+                            parallel_search=parallel_search)
 
-        test_path = "./chess_tests/"
-        test_filenames = sorted([f for f in listdir(test_path) if isfile(join(test_path, f))])
-        test_strings = []
-        for filename in test_filenames:
-            with open(test_path + filename) as f:
-                for string in f:
-                    test_strings.append(string.strip())
+        test_filenames, test_strings = read_test_strings("./chess_tests/")
 
         summary_op = tf.summary.merge_all()
         scaffold = tf.train.Scaffold(summary_op=summary_op)
@@ -77,7 +56,7 @@ def work(env, task_index, cluster, log_dir, verbose):
             episode_number = sess.run(agent.increment_test_episode_count)
             test_idx = (episode_number-1) % num_tests
             d = parse_test_string(test_strings[test_idx])
-            result = agent.test2(d, depth=3)
+            result = agent.test2(d, depth=3, time_limit=time_limit)
 
             filename = test_filenames[test_idx]
             matches = re.split('-|\.', filename)
@@ -106,6 +85,10 @@ if __name__ == "__main__":
     parser.add_argument("chief_ip")
     parser.add_argument("worker_ip")
     parser.add_argument("tester_ip")
+    parser.add_argument("--time_limit", type=float, default=None, help="seconds per test position")
+    parser.add_argument("--search_processes", type=int, default=0,
+                        help="processes per tester for parallel root search, 0 searches in the tester itself; the "
+                             "split search visits more nodes, so it only helps with idle cores")
 
     args = parser.parse_args()
 
@@ -124,7 +107,8 @@ if __name__ == "__main__":
 
     for task_idx, _ in enumerate(tester_hosts):
         env = ChessEnv()
-        p = Process(target=work, args=(env, task_idx, cluster_spec, ckpt_dir, 1))
+        p = Process(target=work, args=(env, task_idx, cluster_spec, ckpt_dir, 1, args.time_limit,
+                                       args.search_processes))
         processes.append(p)
         p.start()
 
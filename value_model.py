@@ -1,3 +1,4 @@
+import numpy as np
 import tensorflow as tf
 from envs.chess import ChessEnv
 
@@ -37,9 +38,15 @@ class ValueModel:
                                           collections=collections)
                     self.value = tf.tanh(tf.matmul(hidden_2, W_3), name='value')
 
+                self.weights = [W_1, W_2, W_3]
                 self.trainable_variables = tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES,
                                                              scope=tf.get_variable_scope().name)
 
+    @staticmethod
+    def get_weight_shapes(hidden_dim=1000):
+        fv_size = ChessEnv.get_feature_vector_size()
+        return [(fv_size, hidden_dim), (hidden_dim, hidden_dim), (hidden_dim, 1)]
+
     def value_function(self, sess):
         def f(fv):
             value = sess.run(self.value,
@@ -48,3 +55,35 @@ class ValueModel:
 
         return f
 
+    def numpy_value_function(self, sess):
+        # snapshot of the current weights; has to be taken again after the variables change
+        return NumpyValueFunction(*sess.run(self.weights))
+
+
+class NumpyValueFunction:
+    # Forward pass of ValueModel without a session call, for evaluating single rows and small batches.
+    def __init__(self, W_1, W_2, W_3):
+        self.W_1 = np.ascontiguousarray(W_1, dtype=np.float32)
+        self.W_2 = np.ascontiguousarray(W_2, dtype=np.float32)
+        self.W_3 = np.ascontiguousarray(W_3, dtype=np.float32)
+
+    def __call__(self, fv):
+        fv = np.asarray(fv, dtype=np.float32)
+        hidden_1 = np.dot(fv, self.W_1)
+        np.maximum(hidden_1, 0, out=hidden_1)
+        hidden_2 = np.dot(hidden_1, self.W_2)
+        np.maximum(hidden_2, 0, out=hidden_2)
+        return np.tanh(np.dot(hidden_2, self.W_3))
+
+    def weighted_gradients(self, fv, weights):
+        # gradients of sum_i weights[i] * value(fv[i]) with respect to W_1, W_2 and W_3, the same as
+        # tf.gradients(value, trainable_variables, grad_ys=weights) on ValueModel
+        fv = np.asarray(fv, dtype=np.float32)
+        hidden_1 = np.maximum(np.dot(fv, self.W_1), 0)
+        hidden_2 = np.maximum(np.dot(hidden_1, self.W_2), 0)
+        value = np.tanh(np.dot(hidden_2, self.W_3))
+
+        d_value = np.reshape(weights, (-1, 1)).astype(np.float32) * (1 - value ** 2)
+        d_hidden_2 = np.dot(d_value, self.W_3.T) * (hidden_2 > 0)
+        d_hidden_1 = np.dot(d_hidden_2, self.W_2.T) * (hidden_1 > 0)
+        return [np.dot(fv.T, d_hidden_1), np.dot(hidden_1.T, d_hidden_2), np.dot(hidden_2.T, d_value)]
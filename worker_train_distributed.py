@@ -1,12 +1,16 @@
 from agents.td_leaf_agent import TDLeafAgent
+from agents.apply_scheduler import ApplyScheduler
+from agents.inference_server import InferenceServer
 from envs.chess import ChessEnv
+from envs.position_sampler import PositionSampler
 from multiprocessing import Process
 import tensorflow as tf
 from value_model import ValueModel
 import argparse
 
 
-def work(env, job_name, task_index, cluster, log_dir, verbose):
+def work(env, job_name, task_index, cluster, log_dir, verbose, grad_compression=None, topk_ratio=0.01,
+         episodes_per_apply=10, max_staleness=None, inference_server=None):
 
     server = tf.train.Server(cluster,
                              job_name=job_name,
@@ -31,7 +35,11 @@ def work(env, job_name, task_index, cluster, log_dir, verbose):
                                 network,
                                 local_network,
                                 env,
-                                verbose=verbose)
+                                verbose=verbose,
+                                grad_compression=grad_compression,
+                                topk_ratio=topk_ratio,
+                                inference_server=inference_server)
+            scheduler = ApplyScheduler(agent, episodes_per_apply=episodes_per_apply, max_staleness=max_staleness)
             summary_op = tf.summary.merge_all()
             scaffold = tf.train.Scaffold(summary_op=summary_op)
 
@@ -46,11 +54,17 @@ def work(env, job_name, task_index, cluster, log_dir, verbose):
             while not sess.should_stop():
                 episode_number = sess.run(agent.increment_train_episode_count)
                 reward = agent.train(num_moves=10, depth=3, pre_train=False)
+                scheduler.episode_done(sess)
                 if agent.verbose:
                     print(worker_name,
                           "EPISODE:", episode_number,
                           "UPDATE:", sess.run(agent.update_count),
-                          "REWARD:", reward)
+                          "REWARD:", reward,
+                          "PUSH BYTES:", agent.push_bytes_per_episode)
+                    if env.position_sampler is not None:
+                        print("SAMPLER:", env.position_sampler.stats())
+                    if inference_server is not None:
+                        print("INFERENCE:", inference_server.stats())
                     print('-' * 100)
 
 
@@ -60,6 +74,21 @@ if __name__ == "__main__":
     parser.add_argument("chief_ip")
     parser.add_argument("worker_ip")
     parser.add_argument("tester_ip")
+    parser.add_argument("--sampler_processes", type=int, default=2,
+                        help="background processes sampling training positions, 0 samples in each worker")
+    parser.add_argument("--prefetch", type=int, default=256, help="positions sampled ahead of time")
+    parser.add_argument("--grad_compression", choices=['none', 'float16', 'topk'], default='none',
+                        help="how episode gradients are sent to the parameter servers")
+    parser.add_argument("--topk_ratio", type=float, default=0.01,
+                        help="fraction of the entries of each gradient sent with topk compression")
+    parser.add_argument("--episodes_per_apply", type=int, default=10, help="episodes per gradient update")
+    parser.add_argument("--max_staleness", type=float, default=None,
+                        help="seconds after which the chief applies fewer than episodes_per_apply episodes")
+    parser.add_argument("--inference_server", action='store_true',
+                        help="evaluate the searches of all trainers of this host in one batching process")
+    parser.add_argument("--max_batch_size", type=int, default=256, help="rows per inference server batch")
+    parser.add_argument("--max_wait_us", type=int, default=200,
+                        help="microseconds a request may wait for the inference server batch to fill up")
 
     args = parser.parse_args()
 
@@ -74,11 +103,24 @@ if __name__ == "__main__":
          "worker": chief_trainer_hosts + worker_trainer_hosts,
          "tester": tester_hosts}
     )
+    if args.sampler_processes > 0:
+        position_sampler = PositionSampler(prefetch=args.prefetch, num_producers=args.sampler_processes)
+    else:
+        position_sampler = None
+    grad_compression = None if args.grad_compression == 'none' else args.grad_compression
+    if args.inference_server:
+        inference_server = InferenceServer(ValueModel.get_weight_shapes(), ChessEnv.get_feature_vector_size(),
+                                           max_batch_size=args.max_batch_size, max_wait_us=args.max_wait_us)
+    else:
+        inference_server = None
+
     processes = []
 
     for task_idx, _ in enumerate(worker_trainer_hosts):
-        env = ChessEnv()
-        p = Process(target=work, args=(env, 'worker', task_idx + len(chief_trainer_hosts), cluster_spec, ckpt_dir, 1))
+        env = ChessEnv(position_sampler=position_sampler)
+        p = Process(target=work, args=(env, 'worker', task_idx + len(chief_trainer_hosts), cluster_spec, ckpt_dir, 1,
+                                       grad_compression, args.topk_ratio, args.episodes_per_apply, args.max_staleness,
+                                       inference_server))
         processes.append(p)
         p.start()
 